@@ -0,0 +1,167 @@
+"""On-disk artifacts of processed uploads for the FastAPI service
+
+Each file_id is processed once. Its extracted text, simplified text and
+highlight spans go to `<file_id>.json`, and the normalized embeddings of
+the highlighted sentences to `<file_id>.npy`, which is loaded
+memory-mapped. All of it lives next to the upload in the temp directory.
+An in-memory index maps file_id to its files, so requests rarely touch the
+directory, and everything of a file_id older than the TTL is removed. A
+file_id uploaded through another worker process is looked up on disk the
+first time it is asked for.
+"""
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Upload names start with a uuid4 file_id
+FILE_ID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+OUTPUT_PREFIX = "simplified_highlighted"
+SWEEP_INTERVAL = 60
+
+
+class ArtifactStore:
+    """file_id index, artifact persistence and TTL cleanup for one directory"""
+
+    def __init__(self, directory, ttl=24 * 3600, cache_size=32):
+        self.directory = directory
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.build_locks = {}
+        self.files = {}  # file_id -> {"upload": path, "created": timestamp}
+        self.loaded = OrderedDict()  # file_id -> artifact, most recently used last
+        self.last_sweep = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the index once from uploads left by a previous run"""
+        for name in os.listdir(self.directory):
+            file_id, _, rest = name.partition("_")
+            if FILE_ID_PATTERN.fullmatch(file_id) and rest and not rest.startswith(OUTPUT_PREFIX):
+                path = os.path.join(self.directory, name)
+                self.files[file_id] = {"upload": path, "created": os.path.getmtime(path)}
+
+    def register(self, file_id, upload_path):
+        with self.lock:
+            self.files[file_id] = {"upload": upload_path, "created": time.time()}
+        self.sweep()
+
+    def _find(self, file_id):
+        """Index entry of file_id, from disk if another worker process took the upload"""
+        with self.lock:
+            entry = self.files.get(file_id)
+        # file_id comes from the client, only well-formed ids reach the filesystem
+        if entry is not None or not FILE_ID_PATTERN.fullmatch(file_id):
+            return entry
+        for path in glob.glob(os.path.join(self.directory, f"{file_id}_*")):
+            if os.path.basename(path)[len(file_id) + 1:].startswith(OUTPUT_PREFIX):
+                continue
+            try:
+                created = os.path.getmtime(path)
+            except OSError:
+                continue
+            if self.ttl and created < time.time() - self.ttl:
+                return None
+            with self.lock:
+                return self.files.setdefault(file_id, {"upload": path, "created": created})
+        return None
+
+    def upload_path(self, file_id):
+        """Path of the uploaded file, or None if unknown or expired"""
+        self.sweep()
+        entry = self._find(file_id)
+        return entry["upload"] if entry else None
+
+    def output_path(self, file_id, extension):
+        return os.path.join(self.directory, f"{file_id}_{OUTPUT_PREFIX}.{extension}")
+
+    def _artifact_paths(self, file_id):
+        base = os.path.join(self.directory, file_id)
+        return base + ".json", base + ".npy"
+
+    def load(self, file_id):
+        """Return a stored artifact, with its embeddings memory-mapped, or None"""
+        if self._find(file_id) is None:
+            return None
+        with self.lock:
+            if file_id in self.loaded:
+                self.loaded.move_to_end(file_id)
+                return self.loaded[file_id]
+        json_path, npy_path = self._artifact_paths(file_id)
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+            artifact["embeddings"] = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        self._remember(file_id, artifact)
+        return artifact
+
+    def save(self, file_id, artifact, embeddings):
+        """Persist an artifact; the files are replaced atomically"""
+        json_path, npy_path = self._artifact_paths(file_id)
+        with open(npy_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+        os.replace(npy_path + ".tmp", npy_path)
+        with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(artifact, f)
+        os.replace(json_path + ".tmp", json_path)
+        return self.load(file_id)
+
+    def get_or_build(self, file_id, build):
+        """Load the artifact of file_id, building it with build(upload_path) only once
+
+        build returns (artifact dict, embeddings). Returns None for an
+        unknown file_id.
+        """
+        artifact = self.load(file_id)
+        if artifact is not None:
+            return artifact
+        upload = self.upload_path(file_id)
+        if upload is None:
+            return None
+        with self.lock:
+            build_lock = self.build_locks.setdefault(file_id, threading.Lock())
+        try:
+            with build_lock:
+                # Another request may have built it while we waited
+                artifact = self.load(file_id)
+                if artifact is None:
+                    artifact = self.save(file_id, *build(upload))
+        finally:
+            with self.lock:
+                self.build_locks.pop(file_id, None)
+        return artifact
+
+    def _remember(self, file_id, artifact):
+        with self.lock:
+            self.loaded[file_id] = artifact
+            self.loaded.move_to_end(file_id)
+            while len(self.loaded) > self.cache_size:
+                self.loaded.popitem(last=False)
+
+    def sweep(self):
+        """Delete uploads, artifacts and outputs older than the TTL, at most once a minute"""
+        now = time.time()
+        if not self.ttl or now - self.last_sweep < SWEEP_INTERVAL:
+            return
+        self.last_sweep = now
+        with self.lock:
+            expired = [file_id for file_id, entry in self.files.items() if entry["created"] < now - self.ttl]
+            for file_id in expired:
+                entry = self.files.pop(file_id)
+                self.loaded.pop(file_id, None)
+                paths = [entry["upload"], *self._artifact_paths(file_id)]
+                paths += [self.output_path(file_id, ext) for ext in ["pdf", "txt"]]
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
@@ -1,13 +1,12 @@
 import os
+import re
 import shutil
+import threading
+import time
 import uuid
 import nltk
-from nltk.tokenize import sent_tokenize
-import spacy
+import numpy as np
 import torch
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer, util
-from PyPDF2 import PdfReader
 from docx.shared import RGBColor
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
@@ -15,17 +14,33 @@ from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+# Shared document processing helpers, installed from the Flask backend
+# (`pip install -r requirements.txt` here installs ../jurify-backend)
+from backends import load_embedder, load_summarizer
+from chunking import chunk_sentences, encode_inputs
+from extraction import extract_text, file_extension, map_file
+from extractive import select_sentences
+from models import EMBEDDER_NAME, SUMMARIZER_NAME
+from profiles import DEGRADE_MIN_SAMPLES, DEGRADE_WINDOW_SECONDS, PROFILES, choose_profile, generation_settings, profile_summarizers
+from segmentation import sentence_spans, split_sentences
+from telemetry import InFlight, LatencyWindow
+
+from artifacts import ArtifactStore
+
 # =========================
 # Setup NLP models and downloads
 # =========================
 nltk.download('punkt', quiet=True)
 nltk.download('punkt')
 nltk.download('punkt_tab')
-spacy.cli.download("en_core_web_sm")
-nlp = spacy.load("en_core_web_sm")
 
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn", device=0 if torch.cuda.is_available() else -1)
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# SUMMARIZER_BACKEND / EMBEDDER_BACKEND select torch, int8 or onnx (see backends.py)
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# SUMMARIZER_MODEL / EMBEDDER_MODEL pick the checkpoints, as in the Flask backend
+summarizer_model, summarizer_tokenizer = load_summarizer(SUMMARIZER_NAME, device=device, local_files_only=False)
+summarizers = {SUMMARIZER_NAME: (summarizer_model, summarizer_tokenizer)}
+summarizers_lock = threading.Lock()
+embedder = load_embedder(EMBEDDER_NAME, device=device, local_files_only=False)
 
 app = FastAPI()
 
@@ -84,63 +99,134 @@ legal_keywords = [
     "payment obligations", "remuneration", "exclusive rights", "non-exclusive license", "contractual warranties", "liability cap"
 ]
 
+# Terms that raise a highlighted sentence to red or orange
+red_terms = ["shall", "must", "required", "liability", "indemnification", "material breach", "termination"]
+orange_terms = ["should", "may", "discretion", "remedy"]
+
+RED = RGBColor(255, 0, 0)
+ORANGE = RGBColor(255, 165, 0)
+YELLOW = RGBColor(255, 255, 0)
+
+def build_keyword_matcher(keywords, red, orange):
+    """Compile keywords and severity terms into one word-bounded regex
+
+    Returns the pattern and a table mapping each lowercased term to
+    (is_keyword, severity), severity 2 for red, 1 for orange, 0 otherwise.
+    A term's severity also counts any severity term inside it, so
+    "limitation of liability" is red.
+    """
+    keyword_set = {k.lower() for k in keywords}
+    terms = sorted(keyword_set | set(red) | set(orange), key=len, reverse=True)
+
+    def contains(term, words):
+        return any(re.search(r"(?<!\w)" + re.escape(w) + r"(?!\w)", term) for w in words)
+
+    table = {}
+    for term in terms:
+        severity = 2 if contains(term, red) else 1 if contains(term, orange) else 0
+        table[term] = (term in keyword_set, severity)
+
+    # Longest terms first so "limitation of liability" wins over "liability"
+    pattern = re.compile(
+        r"(?<!\w)(?:" + "|".join(re.escape(term) for term in terms) + r")(?!\w)",
+        re.IGNORECASE
+    )
+    return pattern, table
+
+keyword_pattern, keyword_table = build_keyword_matcher(legal_keywords, red_terms, orange_terms)
+
 def load_document(filepath):
-    ext = filepath.lower().split(".")[-1]
-    text = ""
-    if ext == "pdf":
-        reader = PdfReader(filepath)
-        for page in reader.pages:
-            if page.extract_text():
-                text += page.extract_text() + "\n"
-    elif ext == "docx":
-        from docx import Document
-        doc = Document(filepath)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    elif ext == "txt":
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
-    else:
+    ext = file_extension(filepath)
+    if ext not in ["pdf", "docx", "txt"]:
         raise ValueError("Unsupported file type. Use pdf, docx, or txt.")
+    data = map_file(filepath)
+    try:
+        text = extract_text(data, ext)
+    finally:
+        if hasattr(data, "close"):
+            data.close()
     return text.strip()
 
-def simplify_text(text, max_chunk=600):
-    sentences = sent_tokenize(text)
-    chunks, chunk, count = [], [], 0
-    for sent in sentences:
-        count += len(sent.split())
-        if count > max_chunk:
-            chunks.append(" ".join(chunk))
-            chunk, count = [sent], len(sent.split())
-        else:
-            chunk.append(sent)
-    if chunk:
-        chunks.append(" ".join(chunk))
-    summaries = summarizer(chunks, max_length=150, min_length=40, do_sample=False)
-    simplified_text = " ".join([s["summary_text"].strip() for s in summaries])
-    simplified_text = " ".join(sent_tokenize(simplified_text))
+# "fast" summarizes only the highest ranked sentences, up to FAST_SUMMARY_TOKENS
+SIMPLIFY_MODE = os.getenv("SIMPLIFY_MODE", "full")
+FAST_SUMMARY_TOKENS = int(os.getenv("FAST_SUMMARY_TOKENS", "2048"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))
+
+# Settings of the "best" generation profile; cheaper profiles scale them down
+SIMPLIFY_GENERATION = {"max_length": 150, "min_length": 40, "do_sample": False}
+
+def get_summarizer(name):
+    """(model, tokenizer) of a summarization checkpoint, the main one if it can't be loaded
+
+    A failed load is retried on the next request instead of remembered.
+    """
+    with summarizers_lock:
+        if name not in summarizers:
+            try:
+                summarizers[name] = load_summarizer(name, device=device, local_files_only=False)
+            except Exception as e:
+                print(f"Summarizer {name} unavailable ({e}), using {SUMMARIZER_NAME}")
+                return summarizers[SUMMARIZER_NAME]
+        return summarizers[name]
+
+# Checkpoints the generation profiles may switch to (FAST_SUMMARIZER_MODEL with
+# AUTO_DEGRADE) load at startup, not when the server is already overloaded
+for name in profile_summarizers():
+    get_summarizer(name)
+
+def simplify_text(text, max_tokens=None, mode=None, profile="best"):
+    sentences = split_sentences(text)
+    if (mode or SIMPLIFY_MODE) == "fast" and sentences:
+        # Rank by MiniLM centrality and legal keyword density instead of sending every word to BART
+        embeddings = embedder.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+        sentences = select_sentences(sentences, embeddings, FAST_SUMMARY_TOKENS, keyword_pattern=keyword_pattern)
+    # Whole sentences packed to SUMMARY_CHUNK_TOKENS; the token ids go straight to generate
+    chunks = chunk_sentences(summarizer_tokenizer, sentences, max_tokens)
+    # Profile checkpoints share the summarizer's tokenizer, so the chunks fit any of them
+    name, generation = generation_settings(SIMPLIFY_GENERATION, profile)
+    model, tokenizer = get_summarizer(name)
+    summaries = []
+    for start in range(0, len(chunks), SUMMARY_BATCH_SIZE):
+        inputs = encode_inputs(tokenizer, chunks[start:start + SUMMARY_BATCH_SIZE]).to(device)
+        with torch.no_grad():
+            ids = model.generate(**inputs, **generation)
+        summaries.extend(tokenizer.batch_decode(ids, skip_special_tokens=True))
+    simplified_text = " ".join([s.strip() for s in summaries])
+    simplified_text = " ".join(split_sentences(simplified_text))
     return simplified_text
 
-def highlight_text(text):
-    doc = nlp(text)
-    sentences = [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+def highlight_spans(text):
+    """Highlight each sentence and return (sentence, color, matches)
+
+    matches holds (start, end, term) offsets into the sentence for every
+    keyword or severity term found. The whole text is scanned once.
+    """
+    matches = iter(keyword_pattern.finditer(text))
+    match = next(matches, None)
 
     highlighted = []
-    for sent in sentences:
-        s_lower = sent.lower()
+    for start, end in sentence_spans(text):
+        sent_matches = []
+        has_keyword = False
+        severity = 0
+        while match is not None and match.start() < end:
+            if match.start() >= start:
+                term = match.group(0).lower()
+                is_keyword, term_severity = keyword_table[term]
+                has_keyword = has_keyword or is_keyword
+                severity = max(severity, term_severity)
+                sent_matches.append((match.start() - start, match.end() - start, term))
+            match = next(matches, None)
+
         color = None
-        for keyword in legal_keywords:
-            if keyword in s_lower:
-                if any(k in s_lower for k in ["shall", "must", "required", "liability", "indemnification", "material breach", "termination"]):
-                    color = RGBColor(255, 0, 0)       # Red
-                elif any(k in s_lower for k in ["should", "may", "discretion", "remedy"]):
-                    color = RGBColor(255, 165, 0)     # Orange
-                else:
-                    color = RGBColor(255, 255, 0)     # Yellow
-                break
-        highlighted.append((sent, color))
+        if has_keyword:
+            color = RED if severity == 2 else ORANGE if severity == 1 else YELLOW
+        highlighted.append((text[start:end], color, sent_matches))
     return highlighted
 
+def highlight_text(text):
+    return [(sent, color) for sent, color, _ in highlight_spans(text)]
+
 def save_pdf(highlighted, filename):
     c = canvas.Canvas(filename, pagesize=letter)
     width, height = letter
@@ -150,11 +236,11 @@ def save_pdf(highlighted, filename):
         text_x = 40
         rect_width = min(520, width - 2 * text_x)
 
-        if color == RGBColor(255, 0, 0):
+        if color == RED:
             c.setFillColorRGB(1, 0.7, 0.7)
-        elif color == RGBColor(255, 165, 0):
+        elif color == ORANGE:
             c.setFillColorRGB(1, 0.9, 0.7)
-        elif color == RGBColor(255, 255, 0):
+        elif color == YELLOW:
             c.setFillColorRGB(1, 1, 0.6)
         else:
             c.setFillColorRGB(1, 1, 1)
@@ -172,80 +258,117 @@ def save_txt(highlighted, filename):
     with open(filename, "w", encoding="utf-8") as f:
         for sent, color in highlighted:
             tag = ""
-            if color == RGBColor(255, 0, 0):
+            if color == RED:
                 tag = "[RED] "
-            elif color == RGBColor(255, 165, 0):
+            elif color == ORANGE:
                 tag = "[ORANGE] "
-            elif color == RGBColor(255, 255, 0):
+            elif color == YELLOW:
                 tag = "[YELLOW] "
             f.write(f"{tag}{sent}\n")
 
+COLOR_NAMES = {RED: "red", ORANGE: "orange", YELLOW: "yellow"}
+COLORS = {name: color for color, name in COLOR_NAMES.items()}
+
 class SimpleChatbot:
-    def _init_(self, highlighted):
-        self.sentences = [sent for sent, color in highlighted]
-        self.embeddings = embedder.encode(self.sentences, convert_to_tensor=True)
+    def __init__(self, sentences, embeddings):
+        self.sentences = sentences
+        self.embeddings = embeddings  # Normalized, possibly memory-mapped
 
     def ask(self, query, top_k=2):
-        q_emb = embedder.encode(query, convert_to_tensor=True)
-        scores = util.cos_sim(q_emb, self.embeddings)[0]
-        top_idx = scores.argsort(descending=True)[:top_k]
+        if not self.sentences:
+            return []
+        q_emb = embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
+        scores = np.asarray(self.embeddings).dot(q_emb)
+        top_idx = np.argsort(-scores)[:top_k]
         return [self.sentences[i] for i in top_idx]
 
 TEMP_DIR = "temp_files"
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
+# Uploads, artifacts and outputs of a file_id are removed after ARTIFACT_TTL seconds (0 = never)
+ARTIFACT_TTL = int(os.getenv("ARTIFACT_TTL", str(24 * 3600)))
+artifacts = ArtifactStore(TEMP_DIR, ttl=ARTIFACT_TTL)
+
+# Documents being processed and recent processing times, for AUTO_DEGRADE
+in_flight = InFlight()
+recent_latency = LatencyWindow(DEGRADE_WINDOW_SECONDS)
+
+def build_artifact(file_path, generation_profile=None):
+    """Extract, simplify, highlight and embed a document once; returns (artifact, embeddings)"""
+    profile = choose_profile(generation_profile, in_flight.count, recent_latency.percentile(95, DEGRADE_MIN_SAMPLES))
+    started = time.perf_counter()
+    with in_flight:
+        artifact, embeddings = _build_artifact(file_path, profile)
+    recent_latency.observe(time.perf_counter() - started)
+    return artifact, embeddings
+
+def _build_artifact(file_path, profile):
+    raw_text = load_document(file_path)
+    simplified = simplify_text(raw_text, profile=profile)
+    highlighted = highlight_spans(simplified)
+    sentences = [sent for sent, _, _ in highlighted]
+    if sentences:
+        embeddings = embedder.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+    else:
+        embeddings = np.zeros((0, embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+    artifact = {
+        "text": raw_text,
+        "simplified": simplified,
+        "profile": profile,
+        "highlights": [[sent, COLOR_NAMES.get(color), matches] for sent, color, matches in highlighted]
+    }
+    return artifact, embeddings
 
+def artifact_highlights(artifact):
+    return [(sent, COLORS.get(color)) for sent, color, _ in artifact["highlights"]]
+
+# Handlers that extract, run the models or write files are plain functions,
+# so FastAPI runs them in its thread pool instead of blocking the event loop
 @app.post("/upload/")
-async def upload_file(file: UploadFile = File(...)):
+def upload_file(file: UploadFile = File(...)):
     file_id = str(uuid.uuid4())
-    file_path = os.path.join(TEMP_DIR, f"{file_id}_{file.filename}")
+    file_path = os.path.join(TEMP_DIR, f"{file_id}_{os.path.basename(file.filename)}")
     with open(file_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
+    artifacts.register(file_id, file_path)
     return {"file_id": file_id, "filename": file.filename, "filepath": file_path}
 
 @app.post("/process/")
-async def process_file(file_id: str = Form(...), user_choice: str = Form("pdf")):
-    matching_files = [f for f in os.listdir(TEMP_DIR) if f.startswith(file_id)]
-    if not matching_files:
+def process_file(file_id: str = Form(...), user_choice: str = Form("pdf"), generation_profile: str = Form(None)):
+    choice = user_choice.lower()
+    if choice not in ["pdf", "txt"]:
+        return JSONResponse({"error": "Unsupported output format"}, status_code=400)
+    if generation_profile and generation_profile not in PROFILES:
+        return JSONResponse({"error": f"Unknown generation profile: {generation_profile}"}, status_code=400)
+
+    # The first request for a file_id decides the profile its artifact is built with
+    artifact = artifacts.get_or_build(file_id, lambda path: build_artifact(path, generation_profile))
+    if artifact is None:
         return JSONResponse({"error": "File not found"}, status_code=404)
-    file_path = os.path.join(TEMP_DIR, matching_files[0])
 
-    raw_text = load_document(file_path)
-    simplified = simplify_text(raw_text)
-    highlighted = highlight_text(simplified)
-
-    out_filename = os.path.join(TEMP_DIR, f"{file_id}_simplified_highlighted")
-    if user_choice.lower() == "pdf":
-        out_filename += ".pdf"
-        save_pdf(highlighted, out_filename)
-    elif user_choice.lower() == "txt":
-        out_filename += ".txt"
-        save_txt(highlighted, out_filename)
-    else:
-        return JSONResponse({"error": "Unsupported output format"}, status_code=400)
+    out_filename = artifacts.output_path(file_id, choice)
+    if not os.path.exists(out_filename):
+        highlighted = artifact_highlights(artifact)
+        if choice == "pdf":
+            save_pdf(highlighted, out_filename)
+        else:
+            save_txt(highlighted, out_filename)
 
-    # Always create new chatbot instance fresh per call
-    # This code is stateless per REST best practice
-    return {"output_file": os.path.basename(out_filename)}
+    return {"output_file": os.path.basename(out_filename), "profile": artifact.get("profile")}
 
 @app.get("/download/")
 async def download_file(filename: str):
-    file_path = os.path.join(TEMP_DIR, filename)
+    file_path = os.path.join(TEMP_DIR, os.path.basename(filename))
     if not os.path.exists(file_path):
         return JSONResponse({"error": "File not found"}, status_code=404)
     return FileResponse(path=file_path, filename=filename, media_type='application/octet-stream')
 
 @app.post("/chat/")
-async def chat(query: str = Form(...), file_id: str = Form(...)):
-    matching_files = [f for f in os.listdir(TEMP_DIR) if f.startswith(file_id)]
-    if not matching_files:
+def chat(query: str = Form(...), file_id: str = Form(...)):
+    # Processed once per file_id; later questions only embed the query
+    artifact = artifacts.get_or_build(file_id, build_artifact)
+    if artifact is None:
         return JSONResponse({"error": "No simplified text available for given file_id"}, status_code=404)
-    file_path = os.path.join(TEMP_DIR, matching_files[0])
-
-    raw_text = load_document(file_path)
-    simplified = simplify_text(raw_text)
-    highlighted = highlight_text(simplified)
-    bot = SimpleChatbot(highlighted)
+    sentences = [sent for sent, _, _ in artifact["highlights"]]
+    bot = SimpleChatbot(sentences, artifact["embeddings"])
 
     answers = bot.ask(query, top_k=3)
-    return {"answers": answers}
\ No newline at end of file
+    return {"answers": answers}
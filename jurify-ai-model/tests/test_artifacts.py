@@ -0,0 +1,47 @@
+import os
+import sys
+import uuid
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import ArtifactStore
+
+
+def upload(store, name="contract.txt"):
+    file_id = str(uuid.uuid4())
+    path = os.path.join(store.directory, f"{file_id}_{name}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("The buyer shall pay.")
+    store.register(file_id, path)
+    return file_id, path
+
+
+def test_file_ids_from_another_worker_are_found_on_disk(tmp_path):
+    # Two stores on one directory stand in for two uvicorn workers
+    first, second = ArtifactStore(str(tmp_path)), ArtifactStore(str(tmp_path))
+    file_id, path = upload(first)
+
+    assert second.upload_path(file_id) == path
+    first.save(file_id, {"simplified": "Pay."}, np.ones((1, 4), dtype=np.float32))
+    other_id, _ = upload(first)
+    assert second.load(file_id)["simplified"] == "Pay."
+    assert second.get_or_build(other_id, lambda path: ({"simplified": "Built."}, np.ones((1, 4))))["simplified"] == "Built."
+
+    assert second.upload_path(str(uuid.uuid4())) is None
+    assert second.upload_path("../" + file_id) is None
+    assert second.load("*") is None
+
+
+def test_failed_build_releases_its_lock(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    file_id, _ = upload(store)
+
+    def build(path):
+        raise RuntimeError("model failed")
+
+    with pytest.raises(RuntimeError):
+        store.get_or_build(file_id, build)
+    assert store.build_locks == {}
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "jurify-backend"))
+
+
+@pytest.fixture(scope="module")
+def chatbot(tmp_path_factory):
+    import backends
+    import nltk
+
+    # chatbot loads its models and NLTK data at import; stand in for both
+    patch = pytest.MonkeyPatch()
+    patch.setattr(backends, "load_summarizer", lambda name, **kwargs: (None, None))
+    patch.setattr(backends, "load_embedder", lambda name, **kwargs: None)
+    patch.setattr(nltk, "download", lambda *args, **kwargs: True)
+    patch.chdir(tmp_path_factory.mktemp("chatbot"))
+    import chatbot
+    yield chatbot
+    patch.undo()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_process_requests_degrade_the_profile(chatbot, monkeypatch):
+    from fastapi.testclient import TestClient
+    import profiles
+
+    monkeypatch.setattr(profiles, "DEGRADE_QUEUE_DEPTH", 1)
+    monkeypatch.setattr(profiles, "DEGRADE_P95_SECONDS", 0)
+    release = threading.Event()
+
+    def build(file_path, profile):
+        release.wait(10)
+        artifact = {"text": "", "simplified": "", "profile": profile, "highlights": []}
+        return artifact, np.zeros((0, 8), dtype=np.float32)
+
+    monkeypatch.setattr(chatbot, "_build_artifact", build)
+
+    with TestClient(chatbot.app) as client:
+        file_ids = [
+            client.post("/upload/", files={"file": (f"contract-{i}.txt", b"The buyer shall pay.")}).json()["file_id"]
+            for i in range(3)
+        ]
+        responses = [None] * 3
+
+        def process(i):
+            responses[i] = client.post("/process/", data={"file_id": file_ids[i], "user_choice": "txt"}).json()
+
+        threads = [threading.Thread(target=process, args=(i,)) for i in range(3)]
+        # Blocking handlers run in the thread pool, so each request sees the earlier ones in flight
+        for i, thread in enumerate(threads):
+            thread.start()
+            wait_for(lambda: chatbot.in_flight.count == i + 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert [response["profile"] for response in responses] == ["best", "balanced", "fast"]
+
+
+def test_keyword_matcher_prefers_the_longest_term_on_word_boundaries(chatbot):
+    pattern, table = chatbot.build_keyword_matcher(
+        ["liability", "limitation of liability", "fee"], ["liability"], ["may"]
+    )
+    text = "Limitation of Liability applies. The mayor may waive fees."
+
+    assert [match.group(0) for match in pattern.finditer(text)] == ["Limitation of Liability", "may"]
+    # Severity terms inside a longer keyword count for it
+    assert table["limitation of liability"] == (True, 2)
+    assert table["may"] == (False, 1)
+
+
+def test_highlight_spans_color_sentences_and_locate_terms(chatbot):
+    text = "The tenant shall pay rent. Parking is free. The landlord may inspect the premises."
+    highlighted = chatbot.highlight_spans(text)
+
+    assert [(sentence, color) for sentence, color, _ in highlighted] == [
+        ("The tenant shall pay rent.", chatbot.RED),
+        ("Parking is free.", None),
+        ("The landlord may inspect the premises.", chatbot.ORANGE),
+    ]
+    for sentence, _, matches in highlighted:
+        for start, end, term in matches:
+            assert sentence[start:end].lower() == term
+    assert [term for _, _, term in highlighted[0][2]] == ["shall"]
@@ -1,190 +1,878 @@
-print("Starting Jurify backend...")
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import os
-import torch
-from transformers import BartForConditionalGeneration, BartTokenizer
-from sentence_transformers import SentenceTransformer
-import spacy
-from PyPDF2 import PdfReader
-from docx import Document
+import numpy as np
 import json
-from functools import lru_cache
-import nltk
-from nltk.tokenize import sent_tokenize
-import re
 import base64
-import tempfile
+import re
+import io
+import threading
+import time
+import uuid
+from werkzeug.datastructures import FileStorage
+from cache import ResultCache, content_key
+from extraction import EXTRACTION_PROCESSES, expand_archives, extract_many, extract_text, file_extension
+from jobs import JobQueue, QueueFullError
+from backends import EMBEDDER_BACKEND, SUMMARIZER_BACKEND
+from models import EMBEDDER_NAME, FAST_SUMMARIZER_NAME, GENERATE_BATCH_SIZE, MODEL_MODE, SUMMARIZER_NAME, LazyModels
+from profiles import DEGRADE_MIN_SAMPLES, DEGRADE_WINDOW_SECONDS, GENERATION_PROFILE, PROFILES, choose_profile, generation_settings
+from chunking import SUMMARY_CHUNK_OVERLAP, SUMMARY_CHUNK_TOKENS, pack_chunks, pack_revision
+from extractive import estimate_tokens, select_sentences
+from segmentation import SEGMENTER, sentence_spans_many, split_sentences
+from revisions import summarize_changes, unchanged_sentences
+from store import create_document_store
+from telemetry import PROFILING, InFlight, LatencyWindow, annotate, begin_trace, count, end_trace, metrics, span, trace_context, traced
+from vector_index import VectorIndex
 
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, origins="*")
 
-# Download required NLTK data
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('punkt_tab', quiet=True)
-except:
-    pass
+# Models load on first use, or in the background once a worker starts (see
+# gunicorn.conf.py). NLTK data and model weights are never downloaded here,
+# run `python models.py download` ahead of time. With MODEL_MODE=server this
+# only connects to model_server.py, which owns the weights
+models = LazyModels(MODEL_MODE)
+if MODEL_MODE == "preload":
+    # Load in the gunicorn master so forked workers share the weights; each
+    # worker warms up after the fork
+    models.load(warm=False)
+
+# Summarization settings
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))
+MAX_SUMMARY_CHUNKS = int(os.getenv("MAX_SUMMARY_CHUNKS", "5"))  # 0 = no limit
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "head")  # "head", "mapreduce" or "fast"
+FAST_SUMMARY_TOKENS = int(os.getenv("FAST_SUMMARY_TOKENS", "2048"))  # Input budget in "fast" mode
+FAST_RANKING = os.getenv("FAST_RANKING", "centroid")  # "centroid" or "textrank"
+# Settings of the "best" generation profile; cheaper profiles scale them down (see profiles.py)
+SUMMARY_GENERATION = {"max_length": 200, "min_length": 50, "length_penalty": 2.0}
+SENTENCE_GENERATION = {"max_length": 100, "min_length": 20}
+
+# Chat retrieval settings
+EMBEDDING_DTYPE = np.float16 if os.getenv("EMBEDDING_DTYPE", "float32") == "float16" else np.float32
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# Background processing settings
+ASYNC_UPLOADS = os.getenv("ASYNC_UPLOADS", "false").lower() == "true"
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "16"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+
+# Batch ingestion settings
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_MB = int(os.getenv("BATCH_MAX_MB", "512"))  # Uncompressed size of a whole batch
+BATCH_WAVE_SIZE = int(os.getenv("BATCH_WAVE_SIZE", "8"))  # Documents sharing each round of model calls
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "4"))
+
+# Document store settings
+DOCUMENT_STORE = os.getenv("DOCUMENT_STORE", "memory")  # "memory" or "sqlite"
+DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "documents.sqlite3"))
+DOCUMENT_STORE_MAX_MB = int(os.getenv("DOCUMENT_STORE_MAX_MB", "256"))
+DOCUMENT_STORE_TTL = int(os.getenv("DOCUMENT_STORE_TTL", str(24 * 3600)))  # 0 = no expiry
+
+# Job status store settings, "sqlite" lets any worker report on any background job
+JOB_STORE = os.getenv("JOB_STORE", DOCUMENT_STORE)  # "memory" or "sqlite"
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "jobs.sqlite3"))
+if JOB_STORE not in ["memory", "sqlite"]:
+    raise ValueError(f"Unknown job store backend: {JOB_STORE}")
+
+# Corpus search settings
+SEARCH_IVF_MIN_ROWS = int(os.getenv("SEARCH_IVF_MIN_ROWS", "50000"))
+SEARCH_IVF_LISTS = int(os.getenv("SEARCH_IVF_LISTS", "0"))  # 0 = sqrt(passages)
+SEARCH_NPROBE = int(os.getenv("SEARCH_NPROBE", "16"))
+SEARCH_MAX_TOP_K = int(os.getenv("SEARCH_MAX_TOP_K", "100"))
 
-# Load models (do this once when server starts)
-print("Loading models...")
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Passages of every stored document, for /api/search. Each process keeps its
+# own; with the sqlite store it catches up on other workers' documents (see
+# sync_corpus_index)
+corpus_index = VectorIndex(
+    dtype=EMBEDDING_DTYPE,
+    ivf_lists=SEARCH_IVF_LISTS,
+    ivf_min_rows=SEARCH_IVF_MIN_ROWS,
+    nprobe=SEARCH_NPROBE
+)
 
-# Summarization
-summarizer_model = BartForConditionalGeneration.from_pretrained("facebook/bart-large-cnn").to(device)
-summarizer_tokenizer = BartTokenizer.from_pretrained("facebook/bart-large-cnn")
+# Processed documents, bounded by size and age. The sqlite backend is shared
+# by every worker process, so requests don't need to stick to one worker
+document_store = create_document_store(
+    DOCUMENT_STORE,
+    path=DOCUMENT_STORE_PATH,
+    max_bytes=DOCUMENT_STORE_MAX_MB * 1024 * 1024,
+    ttl=DOCUMENT_STORE_TTL,
+    on_evict=corpus_index.remove
+)
 
-# NER
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    # os.system("python -m spacy download en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+# Result cache settings
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results.sqlite3"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))  # 0 = disabled
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))  # 0 = no expiry
 
-# Chatbot embeddings
-embed_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Chunk summaries, clause simplifications and whole-document results keyed by
+# SHA-256 of their input, shared by every worker process and kept across restarts
+result_cache = ResultCache(RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024, ttl=RESULT_CACHE_TTL)
 
-print("Models loaded successfully!")
+# Part of every cache key: the settings that change what the pipeline produces
+# for the same input, so switching a model, backend or chunking option never
+# serves results (e.g. embeddings of another dimension) made under the old one
+CONFIG_FINGERPRINT = content_key(
+    SUMMARIZER_NAME, FAST_SUMMARIZER_NAME, EMBEDDER_NAME, SUMMARIZER_BACKEND, EMBEDDER_BACKEND,
+    SUMMARY_CHUNK_TOKENS, SUMMARY_CHUNK_OVERLAP, SUMMARY_MODE, MAX_SUMMARY_CHUNKS, FAST_SUMMARY_TOKENS,
+    FAST_RANKING, SEGMENTER, np.dtype(EMBEDDING_DTYPE).name
+)
 
-# Store document data in memory (in production, use a database)
-document_store = {}
+def cache_lookup(cache_name, key):
+    """result_cache.get that counts hits and misses for /api/metrics and the current span"""
+    value = result_cache.get(key)
+    hit = value is not None
+    metrics.inc("jurify_cache_requests_total", cache=cache_name, result="hit" if hit else "miss")
+    count("cache_hits" if hit else "cache_misses")
+    return value
 
 # Helper functions
-def load_document(file):
-    """Load document from file upload"""
-    text = ""
-    file_extension = file.filename.split('.')[-1].lower()
-    
-    # Save temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as tmp_file:
-        file.save(tmp_file.name)
-        temp_path = tmp_file.name
-    
-    try:
-        if file_extension == "pdf":
-            reader = PdfReader(temp_path)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        elif file_extension in ["docx", "doc"]:
-            try:
-                doc = Document(temp_path)
-            except Exception as e:
-                if file_extension == "doc":
-                    raise ValueError("Legacy .doc files are not supported. Please convert to .docx or .pdf.")
-                raise e
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        elif file_extension == "txt":
-            with open(temp_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        else:
-            raise ValueError("Unsupported file format")
-    finally:
-        # Clean up temp file
-        os.unlink(temp_path)
-    
+@traced
+def load_document(data, filename):
+    """Extract the text of an uploaded document from its bytes"""
+    extension = file_extension(filename)
+    text = extract_text(data, extension)
+    annotate(extension=extension, bytes=len(data), chars=len(text))
     return text
 
-@lru_cache(maxsize=32)
-def cached_summarize(chunk):
-    inputs = summarizer_tokenizer(chunk, return_tensors="pt", truncation=True, max_length=1024).to(device)
-    summary_ids = summarizer_model.generate(**inputs, max_length=200, min_length=50, length_penalty=2.0)
-    return summarizer_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-
-def simplify_document(text, max_chunk_words=500):
-    """Simplify document text using BART with caching"""
-    words = text.split()
-    chunks = [" ".join(words[i:i+max_chunk_words]) for i in range(0, len(words), max_chunk_words)]
-    simplified = []
-    
-    for chunk in chunks[:5]:  # Limit to first 5 chunks for demo
-        if not chunk.strip():
+def summary_key(chunk, profile=None):
+    """Cache key of a chunk given as text or as summarizer token ids"""
+    if not isinstance(chunk, str):
+        chunk = np.asarray(chunk, dtype=np.int32).tobytes()
+    summarizer, generation = generation_settings(SUMMARY_GENERATION, profile or GENERATION_PROFILE)
+    return content_key("summary", CONFIG_FINGERPRINT, summarizer, generation, chunk)
+
+def summarize_chunks(chunks, batch_size=None, profile=None, known=None):
+    """Summarize several chunks with batched generate calls, reusing cached summaries
+
+    `known` maps summary keys to summaries to reuse, e.g. the chunk
+    summaries stored with an earlier version of the document.
+    """
+    batch_size = max(1, batch_size or SUMMARY_BATCH_SIZE)
+    summarizer, generation = generation_settings(SUMMARY_GENERATION, profile or GENERATION_PROFILE)
+    keys = [summary_key(chunk, profile) for chunk in chunks]
+    results = {}
+    pending = {}
+    for key, chunk in zip(keys, chunks):
+        if key in results or key in pending:
+            continue
+        if known and key in known:
+            results[key] = known[key]
+            count("chunks_reused")
             continue
+        summary = cache_lookup("summary", key)
+        if summary is not None:
+            results[key] = summary
+        else:
+            pending[key] = chunk
 
-        summary = cached_summarize(chunk)
-        simplified.append(summary)
-    
-    return "\n\n".join(simplified)
+    # Sort by length so each batch pads to similar sizes
+    pending = sorted(pending.items(), key=lambda item: len(item[1]))
+    tokens = sum(len(chunk) for _, chunk in pending if not isinstance(chunk, str))
+    if tokens:
+        count("input_tokens", tokens)
+        metrics.inc("jurify_tokens_total", tokens, stage="summarize")
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        count("generate_calls")
+        annotate(batch_size=len(batch))
+        summaries = models.generate(
+            [chunk for _, chunk in batch], max_input_length=1024, summarizer=summarizer, **generation
+        )
+        for (key, _), summary in zip(batch, summaries):
+            results[key] = summary
+            result_cache.set(key, summary)
 
-@lru_cache(maxsize=32)
-def extract_clauses(text):
-    """Extract important clauses from the entire document intelligently"""
-    clauses = []
-    legal_terms = {
-        "confidential": "Confidentiality",
-        "termination": "Termination",
-        "payment": "Payment Terms",
-        "liability": "Liability",
-        "warranty": "Warranty",
-        "indemnification": "Indemnity",
-        "jurisdiction": "Governing Law",
-        "dispute": "Dispute Resolution"
-    }
+    return [results[key] for key in keys]
+
+def cached_summarize(chunk, profile=None):
+    return summarize_chunks([chunk], profile=profile)[0]
+
+def chunk_document(sentences, max_tokens=None, even=True):
+    """Pack sentences into chunks of summarizer token ids, tokenizing them once"""
+    return pack_chunks(
+        models.tokenize(sentences),
+        max_tokens or SUMMARY_CHUNK_TOKENS,
+        SUMMARY_CHUNK_OVERLAP,
+        even=even
+    )
+
+LEGAL_TERMS = {
+    "confidential": "Confidentiality",
+    "termination": "Termination",
+    "payment": "Payment Terms",
+    "liability": "Liability",
+    "warranty": "Warranty",
+    "indemnification": "Indemnity",
+    "jurisdiction": "Governing Law",
+    "dispute": "Dispute Resolution"
+}
+
+# Terms that mark a sentence as legally substantive when ranking sentences
+LEGAL_TERMS_PATTERN = re.compile(
+    r"\b(?:" + "|".join(list(LEGAL_TERMS) + [
+        "shall", "must", "indemnif", "breach", "damages", "penalt", "fee", "notice", "terminat",
+        "governing law", "arbitration", "obligat", "warrant", "intellectual property"
+    ]) + ")",
+    re.IGNORECASE
+)
+
+def summary_sentences(sentences, mode, max_chunks, max_chunk_tokens, index=None):
+    """The sentences simplify_document packs into chunks, and the chunk limit that applies to them"""
+    if mode == "fast":
+        sentences = select_sentences(
+            index["passages"], index["embeddings"], FAST_SUMMARY_TOKENS,
+            keyword_pattern=LEGAL_TERMS_PATTERN, method=FAST_RANKING
+        )
+        return sentences, 0  # The token budget already bounds the input
+
+    if mode == "head" and max_chunks:
+        # Only tokenize what the first chunks can hold; the estimate runs
+        # below the real BPE count, so the prefix is never too short
+        budget = max_chunks * max_chunk_tokens
+        used = 0
+        for end, sentence in enumerate(sentences):
+            used += estimate_tokens(sentence)
+            if used > budget:
+                return sentences[:end + 1], max_chunks
+    return sentences, max_chunks
+
+def summary_chunks(text, mode, max_chunks, max_chunk_tokens, index=None, previous=None):
+    """The chunks simplify_document summarizes first, as summarizer token ids
+
+    With the passage index of a previous version of the document, the
+    chunks of that version whose sentences did not change are kept as they
+    were, so their stored summaries can be reused.
+    """
+    if mode == "fast" and index is None:
+        index = build_passage_index(text)
+    sentences, max_chunks = summary_sentences(safe_sent_tokenize(text), mode, max_chunks, max_chunk_tokens, index)
 
-    sentences = safe_sent_tokenize(text)
+    # Chunks past max_chunks are dropped in head mode, so fill each one up
+    even = mode != "head"
+    if previous is None:
+        chunks = chunk_document(sentences, max_chunk_tokens, even)
+    else:
+        previous_sentences, _ = summary_sentences(previous["passages"], mode, max_chunks, max_chunk_tokens, previous)
+        chunks, kept = pack_revision(
+            models.tokenize(sentences),
+            models.tokenize(previous_sentences),
+            unchanged_sentences(previous_sentences, sentences),
+            max_chunk_tokens,
+            SUMMARY_CHUNK_OVERLAP,
+            even
+        )
+        count("chunks_kept", kept)
+    count("sentences", len(sentences))
+    count("chunks", len(chunks))
+    if mode != "mapreduce" and max_chunks:
+        chunks = chunks[:max_chunks]
+    return chunks
+
+def simplify_documents(texts, indexes=None, max_chunk_tokens=None, mode=None, max_chunks=None, batch_size=None,
+                       previous=None, profile=None, known=None):
+    """simplify_document for several documents, summarizing all their chunks in shared batches
+
+    Returns the simplified texts and, per document, the summaries of its
+    chunks by summary key; stored with the document, they are the `known`
+    summaries of its next version.
+    """
+    mode = mode or SUMMARY_MODE
+    max_chunks = MAX_SUMMARY_CHUNKS if max_chunks is None else max_chunks
+    max_chunk_tokens = max_chunk_tokens or SUMMARY_CHUNK_TOKENS
+    indexes = indexes or [None] * len(texts)
+    previous = previous or [None] * len(texts)
+    known = {key: summary for summaries in known or [] if summaries for key, summary in summaries.items()}
+    annotate(mode=mode)
+
+    chunk_lists = [
+        summary_chunks(text, mode, max_chunks, max_chunk_tokens, index, previous_index)
+        for text, index, previous_index in zip(texts, indexes, previous)
+    ]
+    summaries = summarize_chunks([chunk for chunks in chunk_lists for chunk in chunks], batch_size, profile, known)
+
+    results = []
+    chunk_summaries = []
+    offset = 0
+    for chunks in chunk_lists:
+        simplified = summaries[offset:offset + len(chunks)]
+        offset += len(chunks)
+        used = {summary_key(chunk, profile): summary for chunk, summary in zip(chunks, simplified)}
+        while mode == "mapreduce" and max_chunks and len(simplified) > max_chunks:
+            # Each summary is packed whole into the next round's chunks
+            reduced = chunk_document(simplified, max_chunk_tokens)
+            if len(reduced) >= len(simplified):
+                break
+            simplified = summarize_chunks(reduced, batch_size, profile, known)
+            used.update((summary_key(chunk, profile), summary) for chunk, summary in zip(reduced, simplified))
+        results.append("\n\n".join(simplified))
+        chunk_summaries.append(used)
+    return results, chunk_summaries
+
+@traced
+def simplify_document(text, max_chunk_tokens=None, mode=None, max_chunks=None, index=None, previous=None,
+                      profile=None, known=None):
+    """Simplify document text using batched BART summarization with caching
+
+    Whole sentences are packed into chunks of up to `max_chunk_tokens`
+    summarizer tokens. In "head" mode only the first `max_chunks` chunks are
+    summarized. In "mapreduce" mode every chunk is summarized and the
+    summaries are summarized again until at most `max_chunks` remain. In
+    "fast" mode the sentences of the whole document are ranked with their
+    passage embeddings and legal keyword density, and only the best ones up
+    to FAST_SUMMARY_TOKENS are summarized. With `previous`, the passage
+    index of an earlier version, unchanged chunks of that version are kept
+    and `known`, the chunk summaries stored with it, supplies their summaries.
+    `profile` names the generation profile, GENERATION_PROFILE by default.
+    Returns the simplified text and its chunk summaries by summary key.
+    """
+    simplified, summaries = simplify_documents(
+        [text], [index], max_chunk_tokens, mode, max_chunks, previous=[previous], profile=profile, known=[known]
+    )
+    return simplified[0], summaries[0]
+
+def find_clauses(sentences):
+    """Pick the first sentence of each legal clause type, at most 8"""
+    clauses = []
     found_types = set()
 
     for i, sent in enumerate(sentences):
         if len(found_types) >= 8: break # Max 8 unique types
         sent_lower = sent.lower()
-        for term, label in legal_terms.items():
+        for term, label in LEGAL_TERMS.items():
             if term in sent_lower and label not in found_types:
                 clauses.append({
                     "id": len(clauses) + 1,
                     "type": label,
                     "content": sent.strip(),
-                    "simplified": simplify_sentence(sent),
                     "importance": "high" if term in ["liability", "termination", "payment"] else "medium"
                 })
                 found_types.add(label)
                 break
-    
+
     return clauses[:8]
 
-def simplify_sentence(sentence):
+def clause_type(sentence):
+    """The clause type of the first legal term in a sentence, or None"""
+    sentence = sentence.lower()
+    for term, label in LEGAL_TERMS.items():
+        if term in sentence:
+            return label
+    return None
+
+def sentence_key(sentence, profile=None):
+    summarizer, generation = generation_settings(SENTENCE_GENERATION, profile or GENERATION_PROFILE)
+    return content_key("sentence", CONFIG_FINGERPRINT, summarizer, generation, sentence)
+
+def extract_clauses_many(texts, previous=None, profile=None):
+    """extract_clauses for several documents, simplifying all their clauses in one batch
+
+    previous holds the clauses of an earlier version of each document (or
+    None); clauses whose sentence is unchanged keep their simplification.
+    Returns the clauses of each text and whether each list is complete, i.e.
+    has no fallback simplification; only complete lists are cached.
+    """
+    summarizer, generation = generation_settings(SENTENCE_GENERATION, profile or GENERATION_PROFILE)
+    keys = [content_key("clauses", CONFIG_FINGERPRINT, summarizer, generation, text) for text in texts]
+    results = [cache_lookup("clauses", key) for key in keys]
+    pending = [i for i, clauses in enumerate(results) if clauses is None]
+
+    for i in pending:
+        sentences = safe_sent_tokenize(texts[i])
+        results[i] = find_clauses(sentences)
+        count("sentences", len(sentences))
+        count("clauses", len(results[i]))
+
+    known = {
+        clause["content"]: clause["simplified"]
+        for clauses in previous or [] if clauses
+        for clause in clauses if "simplified" in clause
+    }
+    simplified, fallbacks = simplify_sentences(
+        [clause["content"] for i in pending for clause in results[i]], known, profile
+    )
+    simplified = iter(simplified)
+    complete = [True] * len(texts)
+    for i in pending:
+        for clause in results[i]:
+            clause["simplified"] = next(simplified)
+        complete[i] = not any(clause["content"] in fallbacks for clause in results[i])
+        if complete[i]:
+            result_cache.set(keys[i], results[i])
+    return results, complete
+
+@traced
+def extract_clauses(text, previous=None, profile=None):
+    """Extract important clauses from the entire document intelligently
+
+    Returns the clauses and whether they are complete (see extract_clauses_many).
+    """
+    clauses, complete = extract_clauses_many([text], [previous], profile)
+    return clauses[0], complete[0]
+
+def simplify_sentences(sentences, known=None, profile=None):
+    """Simplify several sentences in one batched generate call, memoizing results
+
+    `known` maps sentences to simplifications to reuse, e.g. those of an
+    earlier version of the document. Returns the simplifications and the set
+    of sentences that got a truncated fallback because generate failed;
+    anything built from those must not be cached either.
+    """
+    results = {}
+    pending = []
+    fallbacks = set()
+    for sentence in sentences:
+        if sentence in results or sentence in pending:
+            continue
+        if known and sentence in known:
+            results[sentence] = known[sentence]
+            continue
+        simple = cache_lookup("sentence", sentence_key(sentence, profile))
+        if simple is not None:
+            results[sentence] = simple
+        else:
+            pending.append(sentence)
+
+    if pending:
+        # Sort by length so the batch pads as little as possible
+        pending.sort(key=len)
+        count("generate_calls")
+        annotate(batch_size=len(pending))
+        try:
+            summarizer, generation = generation_settings(SENTENCE_GENERATION, profile or GENERATION_PROFILE)
+            simplified = models.generate(pending, max_input_length=512, summarizer=summarizer, **generation)
+        except Exception:
+            # Fallbacks are not cached so the next request can retry
+            for sentence in pending:
+                results[sentence] = sentence[:100] + "..."
+            fallbacks.update(pending)
+        else:
+            for sentence, simple in zip(pending, simplified):
+                results[sentence] = simple
+                result_cache.set(sentence_key(sentence, profile), simple)
+
+    return [results[sentence] for sentence in sentences], fallbacks
+
+def simplify_sentence(sentence, profile=None):
     """Simplify a single sentence"""
-    try:
-        inputs = summarizer_tokenizer(sentence, return_tensors="pt", truncation=True, max_length=512).to(device)
-        summary_ids = summarizer_model.generate(**inputs, max_length=100, min_length=20)
-        return summarizer_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-    except:
-        return sentence[:100] + "..."
+    return simplify_sentences([sentence], profile=profile)[0][0]
 
 def safe_sent_tokenize(text):
-    """Safe sentence tokenization"""
-    try:
-        return sent_tokenize(text)
-    except:
-        return re.split(r'(?<=[.!?]) +', text)
+    """Safe sentence tokenization, cached so every stage shares one segmentation"""
+    return split_sentences(text)
 
-def chatbot_query(text, user_question, top_k=5):
+def build_passage_indexes(texts, previous=None):
+    """build_passage_index for several documents, embedding all their passages in one call
+
+    Passages repeated within the batch are encoded once, and passages found
+    in `previous` (the indexes of earlier versions) reuse their embedding.
+    """
+    # Segment every document in one batch; safe_sent_tokenize then hits the cache
+    sentence_spans_many(texts)
+    passage_lists = [safe_sent_tokenize(text) for text in texts]
+    reused = {}
+    for index in previous or []:
+        if index is not None:
+            reused.update(zip(index["passages"], index["embeddings"]))
+
+    wanted = list(dict.fromkeys(passage for passages in passage_lists for passage in passages))
+    missing = [passage for passage in wanted if passage not in reused]
+    found = [passage for passage in wanted if passage in reused]
+    count("passages", sum(len(passages) for passages in passage_lists))
+    if found:
+        count("passages_reused", len(found))
+    embeddings = models.encode(missing, batch_size=EMBEDDING_BATCH_SIZE)
+    table = np.concatenate([
+        np.asarray(embeddings, dtype=EMBEDDING_DTYPE),
+        np.asarray([reused[passage] for passage in found], dtype=EMBEDDING_DTYPE).reshape(len(found), -1)
+    ]) if found else np.asarray(embeddings, dtype=EMBEDDING_DTYPE)
+    rows = {passage: row for row, passage in enumerate(missing + found)}
+    return [
+        {
+            "passages": passages,
+            "embeddings": np.ascontiguousarray(table[[rows[passage] for passage in passages]])
+        }
+        for passages in passage_lists
+    ]
+
+@traced
+def build_passage_index(text, previous=None):
+    """Embed every sentence of the full document once, for chat retrieval"""
+    return build_passage_indexes([text], [previous])[0]
+
+def search_passages(index, user_question, top_k=5):
+    """Return the top_k passages of an index by cosine similarity"""
+    passages = index["passages"]
+    if not passages:
+        return []
+    question_embedding = models.encode([user_question])[0]
+    # Embeddings are normalized, so a dot product is the cosine similarity
+    scores = index["embeddings"].dot(question_embedding.astype(index["embeddings"].dtype)).astype(np.float32)
+    k = min(top_k, len(passages))
+    top_idx = np.argpartition(-scores, k - 1)[:k]
+    top_idx = top_idx[np.argsort(-scores[top_idx])]
+    return [passages[i] for i in top_idx]
+
+@traced
+def chatbot_query(text, user_question, top_k=5, index=None):
     """Answer questions about the document using better context retrieval"""
     try:
-        # Scan more sentences from original text for better accuracy
-        sentences = safe_sent_tokenize(text)[:200] 
-        if not sentences: return "I couldn't find enough text to analyze." 
-        sentence_embeddings = embed_model.encode(sentences)
-        question_embedding = embed_model.encode([user_question])
-
-        similarities = torch.nn.functional.cosine_similarity(
-            torch.tensor(question_embedding), torch.tensor(sentence_embeddings)
-        )
-
-        top_idx = torch.topk(similarities, k=min(top_k, len(sentences))).indices
-        answer = " ".join([sentences[i] for i in top_idx])
-        return answer
+        if index is None:
+            index = build_passage_index(text)
+        sentences = search_passages(index, user_question, top_k)
+        if not sentences: return "I couldn't find enough text to analyze."
+        return " ".join(sentences)
     except Exception as e:
         return f"I couldn't find specific information about that in the document."
 
 # API Routes
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    """Liveness: the process is up, models may still be loading"""
     return jsonify({"status": "healthy", "message": "Jurify backend is running"})
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: models are loaded and warmed up"""
+    if models.ready:
+        return jsonify({"status": "ready"})
+    # Retry after a failed load, e.g. when the model server wasn't up yet
+    models.start_loading()
+    return jsonify({"status": models.state, "error": models.error}), 503
+
+class EmptyDocumentError(ValueError):
+    pass
+
+class DocumentNotFoundError(LookupError):
+    pass
+
+PIPELINE_STAGES = ["extracting", "indexing", "simplifying", "extracting_clauses"]
+
+# Documents and batches being processed, by requests or background jobs, and
+# recent processing times of uploaded documents, for AUTO_DEGRADE
+in_flight = InFlight()
+recent_latency = LatencyWindow(DEGRADE_WINDOW_SECONDS)
+
+def pick_profile(requested=None):
+    """The generation profile to process a document with, lowered while the server is overloaded
+
+    Load is what is being processed already plus the uploads and generate
+    requests waiting in their queues; callers pick before they count as
+    in flight themselves. The p95 is only used once DEGRADE_MIN_SAMPLES
+    documents finished within the window.
+    """
+    load = in_flight.count + upload_jobs.depth() + models.depth()
+    profile = choose_profile(requested, load, recent_latency.percentile(95, DEGRADE_MIN_SAMPLES))
+    degraded = profile != (requested or GENERATION_PROFILE)
+    metrics.inc("jurify_generation_profile_total", profile=profile, degraded=str(degraded).lower())
+    annotate(generation_profile=profile, degraded=degraded)
+    return profile
+
+def document_cache_key(data, profile=None):
+    return content_key("document", CONFIG_FINGERPRINT, data, profile or GENERATION_PROFILE)
+
+def corpus_key(text):
+    """Search index source of a document, so identical texts share their passages"""
+    return content_key("corpus", CONFIG_FINGERPRINT, text)
+
+# Store timestamp up to which this process has indexed the shared store's documents
+corpus_synced = 0.0
+corpus_sync_lock = threading.Lock()
+
+def sync_corpus_index():
+    """Index the documents other workers put in the sqlite store, so every worker searches the same corpus"""
+    global corpus_synced
+    if DOCUMENT_STORE != "sqlite":
+        return
+    with corpus_sync_lock:
+        for doc_id, created in document_store.added_since(corpus_synced):
+            if doc_id not in corpus_index:
+                doc_data = document_store.get(doc_id)
+                if doc_data is not None:
+                    index = doc_data["index"]
+                    corpus_index.add(doc_id, index["passages"], index["embeddings"], source=doc_data.get("corpusKey"))
+            corpus_synced = max(corpus_synced, created)
+
+def check_text(text):
+    if not text or len(text.strip()) < 100:
+        raise EmptyDocumentError("Document is empty or too short")
+
+def store_document(filename, original_text, simplified_text, clauses, index, summaries=None, **fields):
+    """Keep a processed document for chat and search, and return its id"""
+    doc_id = str(uuid.uuid4())
+    key = corpus_key(original_text)
+    document_store[doc_id] = {
+        "original": original_text[:5000],  # Store first 5000 chars
+        "simplified": simplified_text,
+        "clauses": clauses,
+        "filename": filename,
+        "index": index,  # Passage embeddings over the full text
+        "summaries": summaries or {},  # Chunk summaries by key, reused by the next version
+        "corpusKey": key,
+        **fields
+    }
+    # Re-uploads of the same text add no passages to the search index
+    corpus_index.add(doc_id, index["passages"], index["embeddings"], source=key)
+    return doc_id
+
+def process_document(file, progress=None, previous_id=None, generation_profile=None):
+    """Run the processing pipeline on an uploaded file and store the result
+
+    With previous_id, the file is a new version of that stored document:
+    only its changed sentences and chunks go through the models, and the
+    result includes a clause-level summary of the changes. The requested
+    generation_profile may be lowered under load (see pick_profile).
+    """
+    started = time.perf_counter()
+    def report(stage):
+        if progress:
+            progress(stage)
+
+    previous = None
+    if previous_id:
+        previous = document_store.get(previous_id)
+        if previous is None:
+            raise DocumentNotFoundError("Previous document not found")
+        annotate(previous=previous_id)
+
+    profile = pick_profile(generation_profile)
+    with in_flight:
+        report("extracting")
+        data = file.stream.read()
+        # Identical uploads reuse the whole result, across workers and restarts
+        cache_key = document_cache_key(data, profile)
+        cached = cache_lookup("document", cache_key)
+        if cached is not None:
+            original_text, simplified_text, clauses, index, summaries = cached
+        else:
+            original_text = load_document(data, file.filename)
+            check_text(original_text)
+
+            # Index first, "fast" simplification ranks sentences with these embeddings
+            report("indexing")
+            index = build_passage_index(original_text, previous=previous and previous["index"])
+
+            report("simplifying")
+            simplified_text, summaries = simplify_document(
+                original_text, index=index, previous=previous and previous["index"], profile=profile,
+                known=previous and previous.get("summaries")
+            )
+
+            report("extracting_clauses")
+            clauses, complete = extract_clauses(original_text, previous=previous and previous["clauses"], profile=profile)
+
+            if complete:
+                result_cache.set(cache_key, (original_text, simplified_text, clauses, index, summaries))
+
+        revision = {}
+        if previous is not None:
+            revision = {
+                "previousDocumentId": previous_id,
+                "version": previous.get("version", 1) + 1,
+                "changes": summarize_changes(previous["index"]["passages"], index["passages"], clause_type)
+            }
+        doc_id = store_document(
+            file.filename, original_text, simplified_text, clauses, index, summaries, profile=profile, **revision
+        )
+        recent_latency.observe(time.perf_counter() - started)
+
+        return {
+            "documentId": doc_id,
+            "profile": profile,
+            **revision,
+            "data": {
+                "original": original_text[:2000] + ("..." if len(original_text) > 2000 else ""),
+                "simplified": simplified_text,
+                "clauses": clauses
+            }
+        }
+
+def process_wave(texts, profile=None):
+    """Index, simplify and extract the clauses of several documents with shared model batches
+
+    Returns (original, simplified, clauses, index, summaries) per text, like the
+    whole-document cache entries, and whether each one is complete enough to
+    cache (see extract_clauses_many).
+    """
+    with span("batch_index", documents=len(texts)):
+        indexes = build_passage_indexes(texts)
+    with span("batch_simplify", documents=len(texts)):
+        simplified, summaries = simplify_documents(texts, indexes, batch_size=GENERATE_BATCH_SIZE, profile=profile)
+    with span("batch_clauses", documents=len(texts)):
+        clauses, complete = extract_clauses_many(texts, profile=profile)
+    return list(zip(texts, simplified, clauses, indexes, summaries)), complete
+
+def ingest_batch(documents, progress=None, generation_profile=None):
+    """Process (filename, data) documents as a pipeline and report each one's outcome
+
+    Documents are extracted in a process pool. As soon as BATCH_WAVE_SIZE
+    texts are ready they are indexed, simplified and searched for clauses
+    together, so the models see large batches while the pool keeps
+    extracting. A wave whose model calls fail is retried one document at a
+    time, so one bad document only fails itself. The generation profile is
+    picked once for the whole batch, before it counts as in flight.
+    """
+    started = time.perf_counter()
+    profile = pick_profile(generation_profile)
+    with in_flight:
+        results = [None] * len(documents)
+        keys = [document_cache_key(data, profile) for _, data in documents]
+
+        def finish(i, output=None, error=None):
+            filename = documents[i][0]
+            if error is not None:
+                results[i] = {"filename": filename, "status": "failed", "error": str(error) or type(error).__name__}
+            else:
+                results[i] = {"filename": filename, "status": "done", "documentId": store_document(filename, *output, profile=profile)}
+            metrics.inc("jurify_batch_documents_total", status=results[i]["status"])
+            if progress:
+                progress("processing", sum(result is not None for result in results) / len(documents))
+
+        def run_wave(wave):
+            try:
+                outputs, complete = process_wave([text for _, text in wave], profile)
+            except Exception as e:
+                if len(wave) == 1:
+                    finish(wave[0][0], error=e)
+                else:
+                    for item in wave:
+                        run_wave([item])
+                return
+            for (i, _), output, cacheable in zip(wave, outputs, complete):
+                if cacheable:
+                    result_cache.set(keys[i], output)
+                finish(i, output)
+
+        # Identical documents seen before are not extracted again
+        pending = []
+        for i, key in enumerate(keys):
+            cached = cache_lookup("document", key)
+            if cached is not None:
+                finish(i, cached)
+            else:
+                pending.append(i)
+
+        wave = []
+        extracted = extract_many(
+            [documents[i] for i in pending],
+            EXTRACTION_PROCESSES,
+            max_pending=max(2 * EXTRACTION_PROCESSES, 2 * BATCH_WAVE_SIZE)
+        )
+        for position, text, error in extracted:
+            i = pending[position]
+            if error is None:
+                try:
+                    check_text(text)
+                except EmptyDocumentError as e:
+                    error = e
+            if error is not None:
+                finish(i, error=error)
+                continue
+            wave.append((i, text))
+            if len(wave) >= BATCH_WAVE_SIZE:
+                run_wave(wave)
+                wave = []
+        if wave:
+            run_wave(wave)
+
+        seconds = time.perf_counter() - started
+        succeeded = sum(result["status"] == "done" for result in results)
+        annotate(documents=len(documents), succeeded=succeeded)
+        return {
+            "profile": profile,
+            "documents": results,
+            "succeeded": succeeded,
+            "failed": len(documents) - succeeded,
+            "seconds": round(seconds, 2),
+            "documentsPerMinute": round(len(documents) / seconds * 60, 1) if seconds else None
+        }
+
+def run_upload_job(file, previous_id=None, generation_profile=None, profile=False, parent=None, progress=None):
+    """Process a background upload in its own trace, linked to the upload request's"""
+    with trace_context("upload_job", parent=parent, profile=profile, filename=file.filename):
+        return process_document(file, progress, previous_id, generation_profile)
+
+# Status of every background job, shared by the worker processes on the host
+job_store = ResultCache(JOB_STORE_PATH, max_bytes=64 * 1024 * 1024, ttl=JOB_RESULT_TTL) if JOB_STORE == "sqlite" else None
+
+upload_jobs = JobQueue(
+    run_upload_job,
+    workers=UPLOAD_WORKERS,
+    max_queue=UPLOAD_QUEUE_SIZE,
+    stages=PIPELINE_STAGES,
+    result_ttl=JOB_RESULT_TTL,
+    shared=job_store
+)
+
+def run_batch_job(documents, generation_profile=None, profile=False, parent=None, progress=None):
+    """Process an uploaded batch in its own trace, linked to the batch request's"""
+    with trace_context("batch_job", parent=parent, profile=profile, documents=len(documents)):
+        return ingest_batch(documents, progress, generation_profile)
+
+# One batch at a time already keeps every core busy
+batch_jobs = JobQueue(
+    run_batch_job,
+    workers=1,
+    max_queue=BATCH_QUEUE_SIZE,
+    stages=["processing"],
+    result_ttl=JOB_RESULT_TTL,
+    name="batch-jobs",
+    shared=job_store
+)
+
+metrics.gauge("jurify_upload_queue_depth", "Uploads waiting for a background worker", upload_jobs.depth)
+metrics.gauge("jurify_batch_queue_depth", "Batches waiting for the batch worker", batch_jobs.depth)
+metrics.gauge("jurify_generate_queue_depth", "Generate requests waiting for the summarizer", models.depth)
+metrics.gauge("jurify_models_ready", "Worker processes whose models are loaded and warmed up", lambda: int(models.ready))
+metrics.gauge("jurify_search_passages", "Passages in the largest worker search index", lambda: len(corpus_index), aggregate="max")
+
+# Probes and scrapes are frequent and uninteresting to trace
+UNTRACED_ENDPOINTS = {None, "health_check", "readiness_check", "metrics_endpoint"}
+
+def wants_profile():
+    if not PROFILING:
+        return False
+    value = request.args.get('profile', request.headers.get('X-Profile', ''))
+    return value.lower() in ["1", "true", "yes"]
+
+@app.before_request
+def start_request_trace():
+    if request.endpoint not in UNTRACED_ENDPOINTS:
+        g.trace = begin_trace(request.endpoint, profile=wants_profile(), method=request.method)
+
+@app.after_request
+def tag_request_trace(response):
+    trace = g.get("trace")
+    if trace is not None:
+        trace.attrs["status"] = response.status_code
+        response.headers["X-Trace-Id"] = trace.id
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    trace = g.pop("trace", None)
+    if trace is None:
+        return
+    end_trace(trace)
+    metrics.observe("jurify_request_seconds", trace.duration, endpoint=trace.name)
+    metrics.inc("jurify_requests_total", endpoint=trace.name, status=trace.attrs.get("status", 500))
+
+def requested_profile():
+    """The generationProfile of a request, or None; raises ValueError for an unknown one"""
+    value = request.args.get('generationProfile', request.form.get('generationProfile'))
+    if value and value not in PROFILES:
+        raise ValueError(f"Unknown generation profile: {value}. Choose one of {', '.join(PROFILES)}")
+    return value or None
+
+def wants_async():
+    value = request.args.get('async', request.form.get('async'))
+    if value is None:
+        return ASYNC_UPLOADS
+    return value.lower() in ["1", "true", "yes"]
+
 @app.route('/api/upload', methods=['POST'])
 def upload_document():
     """Handle document upload and processing"""
@@ -196,47 +884,111 @@ def upload_document():
         if file.filename == '':
             return jsonify({"error": "No file selected"}), 400
 
-        # Generate document ID
-        import uuid
-        doc_id = str(uuid.uuid4())
+        annotate(filename=file.filename)
+
+        # A new version of a stored document only reprocesses what changed
+        previous_id = request.args.get('previousDocumentId', request.form.get('previousDocumentId'))
+        if previous_id and previous_id not in document_store:
+            return jsonify({"error": "Previous document not found"}), 404
+        try:
+            generation_profile = requested_profile()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Load and process document
-        print(f"Processing document: {file.filename}")
-        original_text = load_document(file)
-        print(f"Original text length: {len(original_text)}")
-        print(f"Original text: {original_text[:500]}...")
+        if wants_async():
+            # The request stream is closed once we return, so copy the upload first
+            upload = FileStorage(stream=io.BytesIO(file.read()), filename=file.filename)
+            try:
+                job_id = upload_jobs.submit(upload, previous_id, generation_profile, wants_profile(), g.trace.id)
+            except QueueFullError as e:
+                return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+            status_url = f"/api/jobs/{job_id}"
+            return jsonify({
+                "success": True,
+                "jobId": job_id,
+                "statusUrl": status_url
+            }), 202, {"Location": status_url}
 
-        if not original_text or len(original_text.strip()) < 100:
-            return jsonify({"error": "Document is empty or too short"}), 400
+        result = process_document(file, previous_id=previous_id, generation_profile=generation_profile)
+        return jsonify({"success": True, **result})
+
+    except EmptyDocumentError as e:
+        return jsonify({"error": str(e)}), 400
+    except DocumentNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error processing document: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        print("Simplifying document...")
-        simplified_text = simplify_document(original_text)
+@app.route('/api/batch', methods=['POST'])
+def upload_batch():
+    """Queue several documents, uploaded as files or zip archives, for batch processing"""
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        files = [file for file in files if file.filename]
+        if not files:
+            return jsonify({"error": "No files provided"}), 400
 
-        print("Extracting clauses...")
-        clauses = extract_clauses(original_text)
+        # The request stream is closed once we return, so read everything now
+        try:
+            documents = expand_archives([(file.filename, file.read()) for file in files], BATCH_MAX_MB * 1024 * 1024)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not documents:
+            return jsonify({"error": "No documents found in the upload"}), 400
+        if len(documents) > BATCH_MAX_FILES:
+            return jsonify({"error": f"A batch holds at most {BATCH_MAX_FILES} documents"}), 400
 
-        # Store in memory
-        document_store[doc_id] = {
-            "original": original_text[:5000],  # Store first 5000 chars
-            "simplified": simplified_text,
-            "clauses": clauses,
-            "filename": file.filename
-        }
+        try:
+            generation_profile = requested_profile()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
+        annotate(documents=len(documents))
+        try:
+            job_id = batch_jobs.submit(documents, generation_profile, wants_profile(), g.trace.id)
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+        status_url = f"/api/jobs/{job_id}"
         return jsonify({
             "success": True,
-            "documentId": doc_id,
-            "data": {
-                "original": original_text[:2000] + ("..." if len(original_text) > 2000 else ""),
-                "simplified": simplified_text,
-                "clauses": clauses
-            }
-        })
+            "jobId": job_id,
+            "documents": len(documents),
+            "statusUrl": status_url
+        }), 202, {"Location": status_url}
 
     except Exception as e:
-        print(f"Error processing document: {str(e)}")
+        print(f"Error queuing batch: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the status and stage progress of a background upload or batch"""
+    for jobs in [upload_jobs, batch_jobs]:
+        job = jobs.get(job_id)
+        if job is not None:
+            break
+    else:
+        return jsonify({"error": "Job not found"}), 404
+
+    response = {
+        "success": True,
+        "jobId": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": jobs.stages,
+        "progress": round(job["progress"], 2),
+        "queueDepth": jobs.depth()
+    }
+    if job["status"] == "queued" and job.get("position"):
+        # Only known to the worker process that accepted the job
+        response["position"] = job["position"]
+    if job["status"] == "done":
+        response.update(job["result"])
+    if job["status"] == "failed":
+        response["error"] = job["error"]
+    return jsonify(response)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chatbot queries"""
@@ -248,13 +1000,12 @@ def chat():
         if not document_id or not question:
             return jsonify({"error": "Missing documentId or question"}), 400
 
-        if document_id not in document_store:
+        doc_data = document_store.get(document_id)
+        if doc_data is None:
             return jsonify({"error": "Document not found"}), 404
 
-        doc_data = document_store[document_id]
-
-        # Use simplified text for chatbot
-        answer = chatbot_query(doc_data['original'], question)
+        # Search the passage index built from the full original text
+        answer = chatbot_query(doc_data['original'], question, index=doc_data.get('index'))
 
         return jsonify({
             "success": True,
@@ -265,16 +1016,65 @@ def chat():
         print(f"Chat error: {str(e)}")
         return jsonify({"error": "Failed to process question"}), 500
 
+@app.route('/api/search', methods=['POST'])
+def search():
+    """Find the passages most relevant to a question across all processed documents"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        query = data.get('query')
+        if not query:
+            return jsonify({"error": "Missing query"}), 400
+        top_k = data.get('topK', 10)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= SEARCH_MAX_TOP_K:
+            return jsonify({"error": f"topK must be an integer from 1 to {SEARCH_MAX_TOP_K}"}), 400
+        document_ids = data.get('documentIds')
+        if document_ids is not None and not (
+            isinstance(document_ids, list) and all(isinstance(doc_id, str) for doc_id in document_ids)
+        ):
+            return jsonify({"error": "documentIds must be a list of document IDs"}), 400
+
+        sync_corpus_index()
+        query_embedding = models.encode([query])[0]
+        results = []
+        for doc_id, passage, score in corpus_index.search(query_embedding, top_k, document_ids):
+            doc_data = document_store.get(doc_id)
+            if doc_data is None:
+                # Expired, or evicted by another worker sharing the store
+                corpus_index.remove(doc_id)
+                continue
+            results.append({
+                "documentId": doc_id,
+                "filename": doc_data["filename"],
+                "passage": passage,
+                "score": round(score, 4)
+            })
+
+        return jsonify({"success": True, "results": results})
+
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        return jsonify({"error": "Failed to search documents"}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics of every worker process (of this one with METRICS_STORE=memory)"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/document/<doc_id>', methods=['GET'])
 def get_document(doc_id):
     """Get processed document by ID"""
-    if doc_id not in document_store:
+    doc_data = document_store.get(doc_id)
+    if doc_data is None:
         return jsonify({"error": "Document not found"}), 404
 
     return jsonify({
         "success": True,
-        "data": document_store[doc_id]
+        "data": {key: value for key, value in doc_data.items() if key not in ["index", "summaries", "corpusKey"]}
     })
 
 if __name__ == '__main__':
+    print("Starting Jurify backend...")
+    models.start_loading()
     app.run(debug=True, port=5000, use_reloader=False)
@@ -0,0 +1,199 @@
+"""Selectable inference backends for the summarizer and embedding models
+
+- "torch": fp32 eager PyTorch (default)
+- "int8": PyTorch dynamic int8 quantization of every Linear layer (CPU only)
+- "onnx": ONNX Runtime, needs `optimum[onnxruntime]` for BART and
+  sentence-transformers >= 3.2 with `onnxruntime` for MiniLM
+
+Run `python backends.py check --summarizer int8 --embedder int8` to compare a
+backend against fp32 on a sample set before switching production to it.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SUMMARIZER_BACKEND = os.getenv("SUMMARIZER_BACKEND", "torch")
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch")
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "onnx"))
+
+BACKENDS = ["torch", "int8", "onnx"]
+
+SAMPLE_TEXTS = [
+    "The Receiving Party shall hold and maintain the Confidential Information in strictest confidence for the sole "
+    "and exclusive benefit of the Disclosing Party and shall not, without prior written approval, use for its own "
+    "benefit, publish, copy, or otherwise disclose to others any Confidential Information.",
+    "Either party may terminate this Agreement upon thirty (30) days written notice to the other party. Upon "
+    "termination, the Client shall pay the Consultant for all services rendered up to the effective date of "
+    "termination, and each party shall return all property belonging to the other party.",
+    "In no event shall either party be liable for any indirect, incidental, special or consequential damages, "
+    "including loss of profits, arising out of this Agreement. The total liability of the Supplier shall not "
+    "exceed the fees paid by the Customer in the twelve months preceding the claim.",
+    "This Agreement shall be governed by and construed in accordance with the laws of the State of New York. Any "
+    "dispute arising under this Agreement shall be resolved by binding arbitration in New York City.",
+    "The Tenant agrees to pay the monthly rent of two thousand dollars on the first day of each month. Late payments "
+    "shall incur a fee of five percent of the outstanding amount. The security deposit will be returned within "
+    "thirty days after the lease ends, less any deductions for damage beyond normal wear and tear.",
+]
+
+
+def _quantize(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_summarizer(name, backend=SUMMARIZER_BACKEND, device="cpu", local_files_only=True):
+    """Return (model, tokenizer) for a BART summarization checkpoint"""
+    from transformers import BartForConditionalGeneration, BartTokenizerFast
+
+    # The fast tokenizer splits a whole document's sentences in one batched call
+    tokenizer = BartTokenizerFast.from_pretrained(name, local_files_only=local_files_only)
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError:
+            raise RuntimeError("The onnx summarizer backend needs `pip install optimum[onnxruntime]`")
+        export_dir = os.path.join(ONNX_EXPORT_DIR, name.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            model = ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(name, export=True, local_files_only=local_files_only)
+            model.save_pretrained(export_dir)
+        return model, tokenizer
+
+    model = BartForConditionalGeneration.from_pretrained(name, local_files_only=local_files_only)
+    model.eval()
+    if backend == "int8":
+        if str(device) != "cpu":
+            print("int8 quantization is CPU only, keeping the fp32 summarizer")
+        else:
+            model = _quantize(model)
+    elif backend != "torch":
+        raise ValueError(f"Unknown summarizer backend: {backend}")
+    return model.to(device), tokenizer
+
+
+def load_embedder(name, backend=EMBEDDER_BACKEND, device="cpu", local_files_only=True):
+    """Return a SentenceTransformer for `name` running on `backend`"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return SentenceTransformer(name, device="cpu", backend="onnx", local_files_only=local_files_only)
+    model = SentenceTransformer(name, device=str(device), local_files_only=local_files_only)
+    if backend == "int8":
+        if str(device) != "cpu":
+            print("int8 quantization is CPU only, keeping the fp32 embedder")
+        else:
+            model = _quantize(model)
+    elif backend != "torch":
+        raise ValueError(f"Unknown embedder backend: {backend}")
+    return model
+
+
+def token_f1(candidate, reference):
+    """Unigram overlap F1 (ROUGE-1 F) between two summaries"""
+    cand = candidate.lower().split()
+    ref = reference.lower().split()
+    if not cand or not ref:
+        return float(cand == ref)
+    counts = {}
+    for token in ref:
+        counts[token] = counts.get(token, 0) + 1
+    overlap = 0
+    for token in cand:
+        if counts.get(token, 0) > 0:
+            counts[token] -= 1
+            overlap += 1
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(cand)
+    recall = overlap / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _summarize(model, tokenizer, texts):
+    import torch
+    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=1024)
+    start = time.perf_counter()
+    with torch.no_grad():
+        ids = model.generate(**inputs, max_length=100, min_length=20)
+    return tokenizer.batch_decode(ids, skip_special_tokens=True), time.perf_counter() - start
+
+
+def _embed(model, texts):
+    start = time.perf_counter()
+    embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return embeddings.astype(np.float32), time.perf_counter() - start
+
+
+def check_accuracy(summarizer_name, embedder_name, summarizer_backend, embedder_backend, texts):
+    """Compare backends against fp32 torch and return a report dict"""
+    report = {"samples": len(texts)}
+
+    if summarizer_backend != "torch":
+        ref_model, tokenizer = load_summarizer(summarizer_name, "torch")
+        reference, ref_time = _summarize(ref_model, tokenizer, texts)
+        del ref_model
+        model, tokenizer = load_summarizer(summarizer_name, summarizer_backend)
+        candidate, cand_time = _summarize(model, tokenizer, texts)
+        scores = [token_f1(c, r) for c, r in zip(candidate, reference)]
+        report["summarizer"] = {
+            "backend": summarizer_backend,
+            "rouge1_f_mean": float(np.mean(scores)),
+            "rouge1_f_min": float(np.min(scores)),
+            "speedup": ref_time / cand_time if cand_time else None
+        }
+
+    if embedder_backend != "torch":
+        reference, ref_time = _embed(load_embedder(embedder_name, "torch"), texts)
+        candidate, cand_time = _embed(load_embedder(embedder_name, embedder_backend), texts)
+        cosines = np.sum(reference * candidate, axis=1)
+        # Retrieval only cares that similarities between texts keep their values
+        sim_error = np.abs(reference.dot(reference.T) - candidate.dot(candidate.T))
+        report["embedder"] = {
+            "backend": embedder_backend,
+            "cosine_mean": float(cosines.mean()),
+            "cosine_min": float(cosines.min()),
+            "similarity_max_abs_error": float(sim_error.max()),
+            "speedup": ref_time / cand_time if cand_time else None
+        }
+
+    return report
+
+
+def main():
+    from models import EMBEDDER_NAME, SUMMARIZER_NAME
+
+    parser = argparse.ArgumentParser(description="Check a quantized/ONNX backend against fp32")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--summarizer", choices=BACKENDS, default=SUMMARIZER_BACKEND)
+    parser.add_argument("--embedder", choices=BACKENDS, default=EMBEDDER_BACKEND)
+    parser.add_argument("--samples", help="Text file with one sample per paragraph (blank-line separated)")
+    parser.add_argument("--min-rouge", type=float, default=0.6)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.samples:
+        with open(args.samples, "r", encoding="utf-8") as f:
+            texts = [p.strip() for p in f.read().split("\n\n") if p.strip()]
+
+    report = check_accuracy(SUMMARIZER_NAME, EMBEDDER_NAME, args.summarizer, args.embedder, texts)
+    for section in ["summarizer", "embedder"]:
+        if section in report:
+            print(section, {k: round(v, 4) if isinstance(v, float) else v for k, v in report[section].items()})
+
+    failed = (
+        report.get("summarizer", {}).get("rouge1_f_mean", 1.0) < args.min_rouge
+        or report.get("embedder", {}).get("cosine_min", 1.0) < args.min_cosine
+    )
+    if failed:
+        print("Backend accuracy is below the thresholds")
+        sys.exit(1)
+    print("Backend accuracy OK")
+
+
+if __name__ == "__main__":
+    main()
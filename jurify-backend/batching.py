@@ -0,0 +1,147 @@
+"""Dynamic micro-batching of inference requests from concurrent handlers"""
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from telemetry import metrics
+
+
+class MicroBatcher:
+    """Merges concurrent calls to `fn(items, **params)` into shared batches
+
+    A batch is closed when it holds `max_batch_size` items or `max_wait`
+    seconds after its first request arrived. Only requests with the same
+    params are merged. Requests larger than a batch are split into slices
+    and queued behind single-batch requests, so short calls (a chat
+    question) are not stuck behind a whole document.
+    """
+
+    def __init__(self, fn, max_batch_size=16, max_wait=0.01, name="batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _start(self):
+        with self.lock:
+            # Threads don't survive fork, so start one per process
+            if self.pid != os.getpid():
+                threading.Thread(target=self._loop, name=self.name, daemon=True).start()
+                self.pid = os.getpid()
+
+    def submit(self, items, **params):
+        """Queue items and return one future per slice"""
+        self._start()
+        key = tuple(sorted(params.items()))
+        slices = [items[i:i + self.max_batch_size] for i in range(0, len(items), self.max_batch_size)]
+        priority = 0 if len(slices) == 1 else 1
+        futures = []
+        for part in slices:
+            future = Future()
+            self.queue.put((priority, next(self.counter), key, params, part, future, time.monotonic()))
+            futures.append(future)
+        return futures
+
+    def __call__(self, items, **params):
+        """Run items through the batcher and wait for their results"""
+        items = list(items)
+        if not items:
+            return self.fn(items, **params)
+        results = [future.result() for future in self.submit(items, **params)]
+        if isinstance(results[0], np.ndarray):
+            return np.concatenate(results)
+        return [result for part in results for result in part]
+
+    def depth(self):
+        """Requests waiting to be batched"""
+        return self.queue.qsize()
+
+    def _loop(self):
+        while True:
+            first = self.queue.get()
+            batch = [first]
+            size = len(first[4])
+            deadline = time.monotonic() + self.max_wait
+            deferred = []
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry[2] == first[2] and size + len(entry[4]) <= self.max_batch_size:
+                    batch.append(entry)
+                    size += len(entry[4])
+                else:
+                    deferred.append(entry)
+            # Deferred entries keep their original position in the queue
+            for entry in deferred:
+                self.queue.put(entry)
+            self._run(batch)
+
+    def _run(self, batch):
+        items = [item for entry in batch for item in entry[4]]
+        start = time.monotonic()
+        for entry in batch:
+            metrics.observe("jurify_queue_wait_seconds", start - entry[6], queue=self.name)
+        metrics.observe("jurify_batch_size", len(items), batcher=self.name)
+        try:
+            results = self.fn(items, **batch[0][3])
+        except Exception as e:
+            for entry in batch:
+                entry[5].set_exception(e)
+            return
+        finally:
+            metrics.observe("jurify_batch_seconds", time.monotonic() - start, batcher=self.name)
+        offset = 0
+        for entry in batch:
+            count = len(entry[4])
+            entry[5].set_result(results[offset:offset + count])
+            offset += count
+
+
+class BatchingModels:
+    """Wraps a models backend so generate and encode go through separate batchers"""
+
+    def __init__(self, models, generate_batch_size=8, encode_batch_size=64, max_wait=0.01):
+        self.models = models
+        self.encode_batch_size = encode_batch_size
+        self.generate_batcher = MicroBatcher(models.generate, generate_batch_size, max_wait, name="generate-batcher")
+        self.encode_batcher = MicroBatcher(self._encode, encode_batch_size, max_wait, name="encode-batcher")
+
+    def _encode(self, texts):
+        return self.models.encode(texts, batch_size=self.encode_batch_size)
+
+    def load_summarizer(self, name):
+        # Stand-in models have no checkpoints to load
+        load = getattr(self.models, "load_summarizer", None)
+        return load(name) if load else None
+
+    def tokenize(self, sentences):
+        # Cheap and done once per document, nothing to batch
+        return self.models.tokenize(sentences)
+
+    def generate(self, texts, max_input_length=1024, **generation):
+        return self.generate_batcher(texts, max_input_length=max_input_length, **generation)
+
+    def encode(self, texts, batch_size=None):
+        # The batcher picks the batch size, callers' hints are ignored
+        return self.encode_batcher(texts)
+
+    def embedding_dimension(self):
+        return self.models.embedding_dimension()
+
+    def depth(self):
+        """Generate requests waiting to be batched"""
+        return self.generate_batcher.depth()
@@ -1,31 +1,526 @@
+"""Offline, reproducible benchmark of the document pipeline and the web apps
+
+    python benchmark.py run --documents 12 --clients 1,4 --output results.json
+    python benchmark.py compare before.json after.json
+
+A run generates a seeded synthetic contract corpus (synthetic_corpus.py),
+times each pipeline stage per document, then drives the Flask app (and
+optionally the FastAPI app in jurify-ai-model) with N concurrent HTTP
+clients and reports p50/p95/p99 latency, throughput and peak RSS. The
+full report is written as JSON so runs can be compared.
+
+--models selects what runs inference:
+
+- "fake" (default): deterministic numpy stand-ins with a fixed cost per
+  token, no downloads, fit for CI machines
+- "local": the real backend from models.py; point SUMMARIZER_MODEL and
+  EMBEDDER_MODEL at small checkpoints to keep it cheap
+- "module:function": any factory returning an object with tokenize,
+  generate, encode and embedding_dimension
+
+The FastAPI app always loads its own models (SUMMARIZER_MODEL and
+EMBEDDER_MODEL), so it is only started in-process with --targets fastapi.
+The result cache is off unless --cache is given, so documents are
+processed cold.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import queue
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-import torch
-from app import simplify_document, extract_clauses, chatbot_query
-
-def benchmark_optimizations():
-    print("=== Jurify Final Optimization Benchmarks ===")
-    sample_text = "This is a legal document. Confidentiality is key. Termination requires notice. Liability is limited." * 100
-    
-    # 1. Summarization Cache
-    start = time.time()
-    simplify_document(sample_text)
-    cold_sim = time.time() - start
-    
-    start = time.time()
-    simplify_document(sample_text)
-    warm_sim = time.time() - start
-
-    # 2. Clause Extraction Cache
-    start = time.time()
-    extract_clauses(sample_text)
-    cold_clause = time.time() - start
-    
-    start = time.time()
-    extract_clauses(sample_text)
-    warm_clause = time.time() - start
-
-    print(f"Summarization: Cold={cold_sim:.2f}s, Warm={warm_sim:.4f}s")
-    print(f"Clause Extraction: Cold={cold_clause:.2f}s, Warm={warm_clause:.4f}s")
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CHATBOT_DIR = os.path.join(BACKEND_DIR, "..", "jurify-ai-model")
+
+STAGES = ["extraction", "segmentation", "embedding", "summarization", "clauses", "chat"]
+
+QUESTIONS = [
+    "How can this agreement be terminated?",
+    "What are the payment terms?",
+    "Is liability limited?",
+]
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class FakeModels:
+    """Deterministic stand-in for LocalModels
+
+    Embeddings are hashed bags of words, so retrieval still finds related
+    passages; "summaries" are the leading tokens of the input. Each call
+    sleeps for a fixed cost per token or text, releasing the GIL the way
+    torch does.
+    """
+
+    def __init__(self, generate_ms_per_token=0.05, encode_ms_per_text=0.2, dimension=384):
+        self.generate_ms_per_token = generate_ms_per_token
+        self.encode_ms_per_text = encode_ms_per_text
+        self.dimension = dimension
+        self.vocab = {}
+
+    def _ids(self, text):
+        ids = []
+        for token in TOKEN_PATTERN.findall(text):
+            token_id = zlib.crc32(token.encode("utf-8")) % 50000
+            self.vocab[token_id] = token
+            ids.append(token_id)
+        return ids
+
+    def tokenize(self, sentences):
+        return [self._ids(sentence) for sentence in sentences]
+
+    def generate(self, texts, max_input_length=1024, max_length=128, **generation):
+        inputs = [(self._ids(t) if isinstance(t, str) else list(t))[:max_input_length] for t in texts]
+        time.sleep(self.generate_ms_per_token * sum(len(ids) for ids in inputs) / 1000)
+        return [" ".join(self.vocab.get(i, "") for i in ids[:max_length]) for ids in inputs]
+
+    def encode(self, texts, batch_size=64):
+        time.sleep(self.encode_ms_per_text * len(texts) / 1000)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row, zlib.crc32(word.encode("utf-8")) % self.dimension] += 1
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+    def embedding_dimension(self):
+        return self.dimension
+
+
+def build_models(spec, args):
+    """Return the models backend for --models, or None to let app load its own"""
+    if spec == "local":
+        return None
+    if spec == "fake":
+        from models import with_batching
+        return with_batching(FakeModels(args.fake_generate_ms, args.fake_encode_ms))
+    module_name, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"--models must be fake, local or module:function, got {spec}")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def latency_stats(seconds):
+    """p50/p95/p99 and friends, in milliseconds"""
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "total_s": round(float(ms.sum() / 1000), 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its finished children"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def time_stages(app, corpus, questions):
+    """Run every pipeline stage over each document and collect per-stage latencies"""
+    from extraction import extract_text
+    from segmentation import split_sentences
+
+    samples = defaultdict(list)
+
+    def timed(stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        samples[stage].append(time.perf_counter() - start)
+        return result
+
+    for doc in corpus:
+        text = timed("extraction", extract_text, doc["data"], doc["format"])
+        # Later stages reuse this segmentation from the shared cache
+        timed("segmentation", split_sentences, text)
+        index = timed("embedding", app.build_passage_index, text)
+        timed("summarization", app.simplify_document, text, index=index)
+        timed("clauses", app.extract_clauses, text)
+        for question in questions:
+            timed("chat", app.chatbot_query, text, question, index=index)
+
+    return {stage: latency_stats(samples[stage]) for stage in STAGES}
+
+
+def _request(url, data=None, headers=None, timeout=600):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def post_multipart(url, fields, files):
+    """POST form fields and files ({name: (filename, bytes)}) as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, value in fields.items():
+        body += f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode("utf-8")
+    for name, (filename, data) in files.items():
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 "Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+        body += data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return _request(url, bytes(body), {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+
+def post_json(url, payload):
+    return _request(url, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+
+
+def post_form(url, fields):
+    return _request(url, urllib.parse.urlencode(fields).encode("utf-8"),
+                    {"Content-Type": "application/x-www-form-urlencoded"})
+
+
+def flask_session(base_url, question):
+    """Upload a document synchronously, then ask one question about it"""
+    def run(doc, record):
+        start = time.perf_counter()
+        result = post_multipart(f"{base_url}/api/upload", {"async": "false"}, {"file": (doc["name"], doc["data"])})
+        record("upload", time.perf_counter() - start)
+        start = time.perf_counter()
+        post_json(f"{base_url}/api/chat", {"documentId": result["documentId"], "question": question})
+        record("chat", time.perf_counter() - start)
+    return run
+
+
+def fastapi_session(base_url, question):
+    """Upload, process to a highlighted TXT, then ask one question"""
+    def run(doc, record):
+        start = time.perf_counter()
+        result = post_multipart(f"{base_url}/upload/", {}, {"file": (doc["name"], doc["data"])})
+        record("upload", time.perf_counter() - start)
+        start = time.perf_counter()
+        post_form(f"{base_url}/process/", {"file_id": result["file_id"], "user_choice": "txt"})
+        record("process", time.perf_counter() - start)
+        start = time.perf_counter()
+        post_form(f"{base_url}/chat/", {"file_id": result["file_id"], "query": question})
+        record("chat", time.perf_counter() - start)
+    return run
+
+
+def run_load(session, corpus, clients):
+    """Process every document of corpus through `session` with `clients` concurrent clients"""
+    work = queue.Queue()
+    for doc in corpus:
+        work.put(doc)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def record(operation, seconds):
+        with lock:
+            samples[operation].append(seconds)
+
+    def client():
+        while True:
+            try:
+                doc = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                session(doc, record)
+            except Exception as e:
+                with lock:
+                    errors[f"{type(e).__name__}: {e}"[:200]] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    requests = sum(len(s) for s in samples.values())
+    return {
+        "clients": clients,
+        "documents": len(corpus),
+        "failed_documents": sum(errors.values()),
+        "errors": dict(errors),
+        "wall_s": round(wall, 3),
+        "documents_per_s": round((len(corpus) - sum(errors.values())) / wall, 3),
+        "requests_per_s": round(requests / wall, 3),
+        "operations": {op: latency_stats(s) for op, s in samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_flask(app):
+    """Serve the Flask app from a background thread, return (url, stop)"""
+    import logging
+    from werkzeug.serving import make_server
+
+    # One access log line per request would drown the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-flask", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_fastapi():
+    """Import chatbot.py and serve it with uvicorn from a background thread, return (url, stop)"""
+    import uvicorn
+
+    sys.path.insert(0, CHATBOT_DIR)
+    chatbot = importlib.import_module("chatbot")
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(chatbot.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="benchmark-fastapi", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{port}", stop
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def settings(app):
+    from backends import EMBEDDER_BACKEND, SUMMARIZER_BACKEND
+    from chunking import SUMMARY_CHUNK_TOKENS
+    from models import EMBEDDER_NAME, MICRO_BATCHING, SUMMARIZER_NAME
+    from profiles import AUTO_DEGRADE, GENERATION_PROFILE
+    from segmentation import SEGMENTER
+
+    return {
+        "summarizer": SUMMARIZER_NAME,
+        "embedder": EMBEDDER_NAME,
+        "summarizer_backend": SUMMARIZER_BACKEND,
+        "embedder_backend": EMBEDDER_BACKEND,
+        "summary_mode": app.SUMMARY_MODE,
+        "max_summary_chunks": app.MAX_SUMMARY_CHUNKS,
+        "summary_chunk_tokens": SUMMARY_CHUNK_TOKENS,
+        "embedding_dtype": np.dtype(app.EMBEDDING_DTYPE).name,
+        "segmenter": SEGMENTER,
+        "micro_batching": MICRO_BATCHING,
+        "generation_profile": GENERATION_PROFILE,
+        "auto_degrade": AUTO_DEGRADE,
+    }
+
+
+def corpus_summary(corpus):
+    return {
+        "documents": len(corpus),
+        "formats": {fmt: sum(1 for d in corpus if d["format"] == fmt) for fmt in sorted({d["format"] for d in corpus})},
+        "pages": sum(d["pages"] for d in corpus),
+        "bytes": sum(len(d["data"]) for d in corpus),
+    }
+
+
+def run(args):
+    from synthetic_corpus import build_corpus
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="jurify-benchmark-")
+    # Keep caches and temp files of this run away from the real ones
+    os.environ["RESULT_CACHE_PATH"] = os.path.join(workdir, "results.sqlite3")
+    if not args.cache:
+        os.environ["RESULT_CACHE_MAX_MB"] = "0"
+    os.environ.setdefault("DOCUMENT_STORE", "memory")
+    os.environ.setdefault("ASYNC_UPLOADS", "false")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+
+    formats = args.formats.split(",")
+    pages = [int(p) for p in args.pages.split(",")]
+    print(f"Generating {args.documents} documents (seed {args.seed})...")
+    corpus = build_corpus(args.documents, args.seed, formats, pages, out_dir=args.corpus_dir)
+
+    import app
+    models = build_models(args.models, args)
+    if models is not None:
+        app.models.use(models)
+    start = time.perf_counter()
+    app.models.load()
+    load_time = time.perf_counter() - start
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "models": args.models,
+            "model_load_s": round(load_time, 3),
+            "result_cache": args.cache,
+            "settings": settings(app),
+        },
+        "corpus": dict(corpus_summary(corpus), seed=args.seed),
+        "stages": None,
+        "load": {},
+        "peak_rss_mb": None,
+    }
+
+    if not args.skip_stages:
+        print("Timing pipeline stages...")
+        report["stages"] = time_stages(app, corpus, QUESTIONS)
+        report["stages_peak_rss_mb"] = peak_rss_mb()
+
+    clients = [int(c) for c in args.clients.split(",") if c]
+    for target in [t for t in args.targets.split(",") if t]:
+        url = args.flask_url if target == "flask" else args.fastapi_url
+        stop = None
+        try:
+            if url is None:
+                url, stop = start_flask(app) if target == "flask" else start_fastapi()
+        except Exception as e:
+            print(f"Skipping {target}: {type(e).__name__}: {e}")
+            report["load"][target] = {"skipped": f"{type(e).__name__}: {e}"}
+            continue
+        session = (flask_session if target == "flask" else fastapi_session)(url, QUESTIONS[0])
+        runs = []
+        for i, count in enumerate(clients):
+            # Fresh documents per run so nothing is served from earlier runs
+            load_corpus = build_corpus(count * args.requests, args.seed + 1 + i, formats, pages)
+            print(f"Load test: {target}, {count} clients, {len(load_corpus)} documents...")
+            runs.append(run_load(session, load_corpus, count))
+        report["load"][target] = {"url": url, "runs": runs}
+        if stop:
+            stop()
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    print_report(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+    return report
+
+
+def print_report(report):
+    if report.get("stages"):
+        print(f"\n{'stage':<14}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'total s':>10}")
+        for stage, stats in report["stages"].items():
+            if stats["count"]:
+                print(f"{stage:<14}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}"
+                      f"{stats['p99_ms']:>11.1f}{stats['total_s']:>10.2f}")
+    for target, result in report["load"].items():
+        if "skipped" in result:
+            continue
+        print(f"\n{target}")
+        for r in result["runs"]:
+            print(f"  {r['clients']} clients: {r['documents_per_s']:.2f} docs/s, {r['requests_per_s']:.2f} req/s, "
+                  f"{r['failed_documents']} failed")
+            for op, stats in r["operations"].items():
+                print(f"    {op:<8} p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms  p99 {stats['p99_ms']:.1f} ms")
+    print(f"\npeak RSS (MB): {report['peak_rss_mb']}")
+
+
+def _change(before, after):
+    if not before:
+        return ""
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before_path, after_path):
+    """Print p50/p95 and throughput changes between two benchmark reports"""
+    with open(before_path, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, "r", encoding="utf-8") as f:
+        after = json.load(f)
+
+    rows = []
+    for stage, stats in (after.get("stages") or {}).items():
+        old = (before.get("stages") or {}).get(stage, {})
+        for metric in ["p50_ms", "p95_ms"]:
+            if metric in stats and metric in old:
+                rows.append((f"{stage} {metric}", old[metric], stats[metric]))
+    for target, result in after.get("load", {}).items():
+        old_runs = {r["clients"]: r for r in before.get("load", {}).get(target, {}).get("runs", [])}
+        for r in result.get("runs", []):
+            old = old_runs.get(r["clients"])
+            if not old:
+                continue
+            rows.append((f"{target} x{r['clients']} docs/s", old["documents_per_s"], r["documents_per_s"]))
+            for op, stats in r["operations"].items():
+                if op in old["operations"] and "p95_ms" in stats:
+                    rows.append((f"{target} x{r['clients']} {op} p95_ms", old["operations"][op]["p95_ms"], stats["p95_ms"]))
+    old_rss = (before.get("peak_rss_mb") or {}).get("self")
+    new_rss = (after.get("peak_rss_mb") or {}).get("self")
+    if old_rss and new_rss:
+        rows.append(("peak RSS MB", old_rss, new_rss))
+
+    for name, old, new in rows:
+        print(f"{name:<36}{old:>12.2f}{new:>12.2f}{_change(old, new):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Jurify pipeline and web apps")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark")
+    run_parser.add_argument("--documents", type=int, default=12, help="Documents for stage timings")
+    run_parser.add_argument("--pages", default="1,5,20", help="Page counts to draw document lengths from")
+    run_parser.add_argument("--formats", default="pdf,docx,txt")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--corpus-dir", help="Also write the generated corpus here")
+    run_parser.add_argument("--models", default="fake", help="fake, local or module:function")
+    run_parser.add_argument("--fake-generate-ms", type=float, default=0.05, help="Stand-in generate cost per input token")
+    run_parser.add_argument("--fake-encode-ms", type=float, default=0.2, help="Stand-in encode cost per text")
+    run_parser.add_argument("--cache", action="store_true", help="Keep the result cache on")
+    run_parser.add_argument("--skip-stages", action="store_true")
+    run_parser.add_argument("--targets", default="flask", help="Comma separated: flask, fastapi")
+    run_parser.add_argument("--clients", default="1,4", help="Comma separated concurrency levels")
+    run_parser.add_argument("--requests", type=int, default=2, help="Documents per client in each load run")
+    run_parser.add_argument("--flask-url", help="Benchmark a running Flask server instead of an in-process one")
+    run_parser.add_argument("--fastapi-url", help="Benchmark a running FastAPI server instead of an in-process one")
+    run_parser.add_argument("--output", help="Write the JSON report here")
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args.before, args.after)
+
 
 if __name__ == "__main__":
-    benchmark_optimizations()
+    main()
@@ -0,0 +1,172 @@
+"""Content-addressed result cache on local disk, shared by all worker processes"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_created ON entries (created);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (id, total_size) VALUES (0, 0);
+"""
+
+# Reads refresh an entry's LRU position at most this often
+TOUCH_INTERVAL = 60
+
+
+def content_key(*parts):
+    """SHA-256 over the given str/bytes parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, (bytes, bytearray, memoryview)):
+            part = repr(part).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed key/value cache with a size bound (LRU) and a TTL
+
+    Values are pickled, so only store data produced by this service. A
+    max_bytes of 0 disables the cache.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or getattr(self.local, "pid", None) != os.getpid():
+            # Connections must not be shared across threads or forked processes
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        if not self.enabled:
+            return None
+        conn = self._connect()
+        row = conn.execute("SELECT value, created, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl and row[1] < now - self.ttl):
+            self.misses += 1
+            return None
+        if row[2] < now - TOUCH_INTERVAL:
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        """Store value under key and evict old entries past the size bound
+
+        Returns the keys that were evicted to make room.
+        """
+        if not self.enabled:
+            return []
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return []
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            conn.execute("UPDATE stats SET total_size = total_size + ? WHERE id = 0", (len(blob) - (old[0] if old else 0),))
+            evicted = self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return evicted
+
+    def delete(self, key):
+        """Remove key from the cache if present"""
+        if not self.enabled:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.execute("UPDATE stats SET total_size = total_size - ? WHERE id = 0", (row[0],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def keys_since(self, created):
+        """(key, created) of the live entries stored at or after `created`, oldest first"""
+        if not self.enabled:
+            return []
+        if self.ttl:
+            created = max(created, time.time() - self.ttl)
+        return self._connect().execute(
+            "SELECT key, created FROM entries WHERE created >= ? ORDER BY created", (created,)
+        ).fetchall()
+
+    def total_size(self):
+        """Bytes currently stored"""
+        if not self.enabled:
+            return 0
+        return self._connect().execute("SELECT total_size FROM stats WHERE id = 0").fetchone()[0]
+
+    def _evict(self, conn, now):
+        evicted = []
+        if self.ttl:
+            rows = conn.execute("SELECT key, size FROM entries WHERE created < ?", (now - self.ttl,)).fetchall()
+            if rows:
+                conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+                conn.execute("UPDATE stats SET total_size = total_size - ? WHERE id = 0", (sum(size for _, size in rows),))
+                evicted.extend(key for key, _ in rows)
+        total = conn.execute("SELECT total_size FROM stats WHERE id = 0").fetchone()[0]
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                evicted.append(key)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        conn.execute("UPDATE stats SET total_size = ? WHERE id = 0", (max(total, 0),))
+        return evicted
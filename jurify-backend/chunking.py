@@ -0,0 +1,177 @@
+"""Token-aware chunking for the BART summarizer
+
+Sentences are tokenized once, in one batched tokenizer call, and whole
+sentences are packed into chunks of token ids that fit the model input.
+The ids are passed straight to generate, so no chunk string is ever
+re-tokenized or silently truncated.
+"""
+import math
+import os
+
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "900"))
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("SUMMARY_CHUNK_OVERLAP", "0"))
+
+
+def tokenize_sentences(tokenizer, sentences):
+    """Return the token ids of each sentence, without special tokens
+
+    Every sentence but the first gets its leading space back, so the ids
+    match how the sentence is tokenized inside the running text.
+    """
+    if not sentences:
+        return []
+    texts = [s if i == 0 else " " + s for i, s in enumerate(sentences)]
+    return tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+
+
+def _tail(current, pieces, budget):
+    """Trailing pieces of current whose total length fits in budget"""
+    tail, size = [], 0
+    for piece in reversed(current):
+        if size + len(pieces[piece]) > budget:
+            break
+        tail.insert(0, piece)
+        size += len(pieces[piece])
+    return tail, size
+
+
+def _split(sentence_ids, max_tokens):
+    """Cut sentences into pieces of at most max_tokens ids; returns (pieces, sentence of each piece)"""
+    pieces, owners = [], []
+    for sentence, ids in enumerate(sentence_ids):
+        for i in range(0, len(ids), max_tokens):
+            pieces.append(list(ids[i:i + max_tokens]))
+            owners.append(sentence)
+    return pieces, owners
+
+
+def _pack(pieces, start, stop, max_tokens, overlap_tokens, even, carried=()):
+    """Pack pieces[start:stop] into chunks of piece indices
+
+    `carried` are pieces the first chunk starts with, as the overlap of an
+    earlier chunk. Returns the chunks and, for each, the position of its
+    first piece that was not carried over from the chunk before.
+    """
+    remaining = sum(len(pieces[piece]) for piece in range(start, stop))
+
+    def next_target(carried):
+        # Spread what is left over the chunks it needs after the carried overlap
+        if not even or remaining == 0:
+            return max_tokens
+        return carried + math.ceil(remaining / math.ceil(remaining / (max_tokens - carried)))
+
+    chunks, firsts = [], []
+    current = list(carried)
+    size = sum(len(pieces[piece]) for piece in current)
+    fresh = 0
+    target = next_target(size)
+    for piece in range(start, stop):
+        grown = size + len(pieces[piece])
+        # Close the chunk at whichever sentence boundary lands nearest the target
+        if fresh and (grown > max_tokens or grown - target > target - size):
+            chunks.append(current)
+            firsts.append(len(current) - fresh)
+            current, size = _tail(current, pieces, overlap_tokens)
+            fresh = 0
+            target = next_target(size)
+        while current and size + len(pieces[piece]) > max_tokens:
+            size -= len(pieces[current.pop(0)])
+        current.append(piece)
+        size += len(pieces[piece])
+        remaining -= len(pieces[piece])
+        fresh += 1
+    if fresh:
+        chunks.append(current)
+        firsts.append(len(current) - fresh)
+    return chunks, firsts
+
+
+def pack_chunks(sentence_ids, max_tokens, overlap_tokens=0, even=True, spans=False):
+    """Pack consecutive sentences into chunks of at most max_tokens token ids
+
+    With `even`, chunks are filled to an even size, the remaining tokens
+    spread over the fewest chunks that can hold them, so a batch of chunks
+    pads very little; otherwise every chunk is filled as far as it goes. A
+    sentence longer than max_tokens is cut into max_tokens windows. With
+    overlap_tokens, a chunk starts with the last sentences of the previous
+    one that fit in that many tokens. With `spans`, also return the
+    (start, end) range of sentences each chunk draws from.
+    """
+    pieces, owners = _split(sentence_ids, max_tokens)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    chunks, _ = _pack(pieces, 0, len(pieces), max_tokens, overlap_tokens, even)
+    packed = [[token for piece in chunk for token in pieces[piece]] for chunk in chunks]
+    if spans:
+        return packed, [(owners[chunk[0]], owners[chunk[-1]] + 1) for chunk in chunks]
+    return packed
+
+
+def pack_revision(sentence_ids, previous_ids, unchanged, max_tokens, overlap_tokens=0, even=True):
+    """pack_chunks for a revised document, keeping the chunks of its previous version that did not change
+
+    `unchanged` maps the index of every previous sentence that survived the
+    revision to its index in the new document. Previous chunks made only of
+    surviving sentences (or windows of them), still adjacent and in order,
+    are kept with the same token ids, so their cached summaries stay valid.
+    Only the pieces in between are packed anew, carrying the overlap of the
+    chunk before them. An unchanged document gets exactly the chunks of
+    pack_chunks. Returns the chunks and how many were kept.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    pieces, owners = _split(sentence_ids, max_tokens)
+    previous_pieces, previous_owners = _split(previous_ids, max_tokens)
+    previous_chunks, previous_firsts = _pack(
+        previous_pieces, 0, len(previous_pieces), max_tokens, overlap_tokens, even
+    )
+
+    # Pieces of a surviving sentence with the same ids map one to one
+    first_piece = {}
+    for piece, sentence in enumerate(owners):
+        first_piece.setdefault(sentence, piece)
+    previous_first = {}
+    for piece, sentence in enumerate(previous_owners):
+        previous_first.setdefault(sentence, piece)
+    moved = {}  # previous piece -> piece of the new document
+    for piece, sentence in enumerate(previous_owners):
+        target = unchanged.get(sentence)
+        if target is not None and list(sentence_ids[target]) == list(previous_ids[sentence]):
+            moved[piece] = first_piece[target] + piece - previous_first[sentence]
+
+    chunks = []
+    kept = 0
+    position = 0  # first piece of the new document no chunk has covered yet
+    for chunk, first in zip(previous_chunks, previous_firsts):
+        if any(piece not in moved for piece in chunk):
+            continue
+        mapped = [moved[piece] for piece in chunk]
+        if any(b != a + 1 for a, b in zip(mapped, mapped[1:])) or mapped[first] < position:
+            continue
+        if mapped[first] > position:
+            carried, _ = _tail(chunks[-1], pieces, overlap_tokens) if chunks else ([], 0)
+            chunks.extend(_pack(pieces, position, mapped[first], max_tokens, overlap_tokens, even, carried)[0])
+        chunks.append(mapped)
+        kept += 1
+        position = mapped[-1] + 1
+    if position < len(pieces):
+        carried, _ = _tail(chunks[-1], pieces, overlap_tokens) if chunks else ([], 0)
+        chunks.extend(_pack(pieces, position, len(pieces), max_tokens, overlap_tokens, even, carried)[0])
+    return [[token for piece in chunk for token in pieces[piece]] for chunk in chunks], kept
+
+
+def chunk_sentences(tokenizer, sentences, max_tokens=None, overlap_tokens=None, even=True):
+    """Tokenize sentences once and pack them into chunks of token ids"""
+    max_tokens = max_tokens or SUMMARY_CHUNK_TOKENS
+    overlap_tokens = SUMMARY_CHUNK_OVERLAP if overlap_tokens is None else overlap_tokens
+    return pack_chunks(tokenize_sentences(tokenizer, sentences), max_tokens, overlap_tokens, even)
+
+
+def encode_inputs(tokenizer, items, max_length=1024):
+    """Padded encoder inputs for a batch of texts and/or chunks of token ids"""
+    texts = [item for item in items if isinstance(item, str)]
+    tokenized = iter(tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"] if texts else [])
+    room = max_length - tokenizer.num_special_tokens_to_add()
+    input_ids = [
+        tokenizer.build_inputs_with_special_tokens(list(next(tokenized) if isinstance(item, str) else item)[:room])
+        for item in items
+    ]
+    return tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
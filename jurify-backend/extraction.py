@@ -0,0 +1,284 @@
+"""Text extraction from uploaded documents without temp files
+
+Large PDFs and the documents of a batch are extracted in one process pool
+per server process, started on first use and kept for its lifetime. Pool
+workers read a large PDF from a shared memory segment, not a pickled copy.
+"""
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from PyPDF2 import PdfReader
+
+# PDFs with at least this many pages are split across a process pool
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PARALLEL_PAGE_THRESHOLD", "24"))
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", str(min(8, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", "8"))
+# The pool starts inside threaded servers, where forking can copy locks held
+# by other threads, so workers are spawned by default
+EXTRACTION_START_METHOD = os.getenv("EXTRACTION_START_METHOD", "spawn")
+
+SUPPORTED_EXTENSIONS = ["pdf", "docx", "doc", "txt"]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# (segment name, SharedMemory, PdfReader) of the PDF a pool worker last extracted pages from
+_worker_pdf = (None, None, None)
+
+
+def file_extension(filename):
+    return filename.split(".")[-1].lower()
+
+
+def map_file(path):
+    """Memory-map a file on disk for reading"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _init_pool_worker():
+    global EXTRACTION_PROCESSES
+    # Work is already spread over the pool, a worker never starts its own
+    EXTRACTION_PROCESSES = 1
+
+
+def extraction_pool():
+    """The process pool shared by every extraction in this process"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_PROCESSES,
+                mp_context=multiprocessing.get_context(EXTRACTION_START_METHOD),
+                initializer=_init_pool_worker
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a broken pool (e.g. a worker was killed) so the next extraction starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+class _BufferStream(io.RawIOBase):
+    """Read-only, seekable file over a buffer, without copying it like BytesIO"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        count = max(0, min(len(target), len(self.buffer) - self.position))
+        target[:count] = self.buffer[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.buffer)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        # A view left open would keep its shared memory segment from closing
+        if isinstance(self.buffer, memoryview):
+            self.buffer.release()
+        self.buffer = None
+        super().close()
+
+
+def _extract_page_range(name, size, start, stop):
+    global _worker_pdf
+    # Every task of a document reads the same segment, parse it once per worker
+    if _worker_pdf[0] != name:
+        segment = shared_memory.SharedMemory(name=name)
+        previous = _worker_pdf
+        _worker_pdf = (name, segment, PdfReader(_BufferStream(segment.buf[:size])))
+        if previous[1] is not None:
+            previous[2].stream.close()
+            previous[1].close()
+    reader = _worker_pdf[2]
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(data):
+    """Yield the text of each PDF page in order, as soon as it is available
+
+    Large PDFs are split into page ranges over the pool; workers attach to
+    a shared memory copy of the document.
+    """
+    stream = data if isinstance(data, mmap.mmap) else io.BytesIO(data)
+    reader = PdfReader(stream)
+    page_count = len(reader.pages)
+
+    if page_count < PARALLEL_PAGE_THRESHOLD or EXTRACTION_PROCESSES < 2:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    size = len(data)
+    segment = shared_memory.SharedMemory(create=True, size=size)
+    pool = extraction_pool()
+    futures = []
+    try:
+        segment.buf[:size] = data
+        futures = [
+            pool.submit(_extract_page_range, segment.name, size, start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ]
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Workers still reading keep their mapping until they move on
+        for future in futures:
+            future.cancel()
+        segment.close()
+        segment.unlink()
+
+
+def docx_paragraphs(data, extension):
+    """Yield the text of each paragraph of a DOCX document"""
+    from docx import Document
+    try:
+        doc = Document(io.BytesIO(data))
+    except Exception as e:
+        if extension == "doc":
+            raise ValueError("Legacy .doc files are not supported. Please convert to .docx or .pdf.")
+        raise e
+    for para in doc.paragraphs:
+        yield para.text
+
+
+def iter_pages(data, extension):
+    """Yield text blocks (PDF pages, DOCX paragraphs or the whole TXT file) in order"""
+    if extension == "pdf":
+        yield from iter_pdf_pages(data)
+    elif extension in ["docx", "doc"]:
+        yield from docx_paragraphs(data, extension)
+    elif extension == "txt":
+        yield bytes(data).decode("utf-8")
+    else:
+        raise ValueError("Unsupported file format")
+
+
+def extract_text(data, extension):
+    """Extract the full text of a document held in memory"""
+    if extension == "txt":
+        return bytes(data).decode("utf-8")
+    blocks = iter_pages(data, extension)
+    if extension == "pdf":
+        blocks = (page for page in blocks if page)
+    return "".join(block + "\n" for block in blocks)
+
+
+def expand_archives(documents, max_bytes):
+    """Replace .zip uploads in a list of (filename, data) with the files they contain
+
+    Archive members keep their path inside the archive as filename;
+    directories and macOS resource forks are skipped. Raises ValueError when
+    the uncompressed batch would exceed max_bytes.
+    """
+    expanded = []
+    total = 0
+    for filename, data in documents:
+        if file_extension(filename) != "zip":
+            total += len(data)
+            expanded.append((filename, data))
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            raise ValueError(f"{filename} is not a valid zip archive")
+        with archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                # Check the declared size before inflating anything
+                total += member.file_size
+                if total > max_bytes:
+                    break
+                expanded.append((name, archive.read(member)))
+        if total > max_bytes:
+            break
+    if total > max_bytes:
+        raise ValueError(f"Batch is larger than {max_bytes // (1024 * 1024)} MB uncompressed")
+    return expanded
+
+
+def extract_many(documents, processes=None, max_pending=None):
+    """Extract the text of (filename, data) documents in the extraction pool
+
+    Yields (position, text, error) as each document finishes, so callers can
+    start on the first documents while the rest are still extracted. At most
+    `max_pending` documents are handed to the pool at a time; with fewer
+    than 2 `processes` they are extracted here, one after the other.
+    """
+    processes = max(1, min(processes or EXTRACTION_PROCESSES, len(documents)))
+    items = iter(enumerate(documents))
+    if processes < 2:
+        for position, (filename, data) in items:
+            try:
+                yield position, extract_text(data, file_extension(filename)), None
+            except Exception as e:
+                yield position, None, e
+        return
+
+    max_pending = max(processes, max_pending or processes * 2)
+    pool = extraction_pool()
+    pending = {}
+    broken = False
+    while True:
+        while not broken and len(pending) < max_pending:
+            item = next(items, None)
+            if item is None:
+                break
+            position, (filename, data) = item
+            try:
+                future = pool.submit(extract_text, bytes(data), file_extension(filename))
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory); fail what is left
+                broken = True
+                yield position, None, e
+                break
+            pending[future] = position
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            position = pending.pop(future)
+            try:
+                yield position, future.result(), None
+            except BrokenProcessPool as e:
+                broken = True
+                yield position, None, e
+            except Exception as e:
+                yield position, None, e
+    if broken:
+        _discard_pool(pool)
+    for position, _ in items:
+        yield position, None, BrokenProcessPool("Extraction worker died")
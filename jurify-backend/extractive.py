@@ -0,0 +1,73 @@
+"""Cheap extractive sentence ranking used to shrink abstractive summarization input"""
+import re
+
+import numpy as np
+
+
+def estimate_tokens(sentence):
+    """Rough BART token count: words plus punctuation marks"""
+    return len(re.findall(r"\w+|[^\w\s]", sentence))
+
+
+def keyword_density(sentences, keyword_pattern):
+    """Keyword hits per word for each sentence"""
+    density = np.zeros(len(sentences), dtype=np.float32)
+    for i, sentence in enumerate(sentences):
+        words = len(sentence.split())
+        if words:
+            density[i] = len(keyword_pattern.findall(sentence)) / words
+    return density
+
+
+def centrality(embeddings, method="centroid", iterations=20, damping=0.85):
+    """Score sentences by similarity to the document as a whole
+
+    "centroid" compares each normalized embedding with the mean embedding.
+    "textrank" runs PageRank over the sentence similarity graph, which is
+    quadratic in the number of sentences.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) == 0:
+        return np.zeros(0, dtype=np.float32)
+    if method == "textrank":
+        similarity = np.clip(embeddings.dot(embeddings.T), 0, None)
+        np.fill_diagonal(similarity, 0)
+        totals = similarity.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+        transition = similarity / totals
+        scores = np.full(len(embeddings), 1.0 / len(embeddings), dtype=np.float32)
+        for _ in range(iterations):
+            scores = (1 - damping) / len(embeddings) + damping * transition.T.dot(scores)
+        return scores
+    centroid = embeddings.mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    if norm == 0:
+        return np.zeros(len(embeddings), dtype=np.float32)
+    return embeddings.dot(centroid / norm)
+
+
+def _rescale(values):
+    spread = values.max() - values.min() if len(values) else 0
+    if spread == 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / spread
+
+
+def select_sentences(sentences, embeddings, token_budget, keyword_pattern=None,
+                     keyword_weight=0.3, method="centroid", count_tokens=estimate_tokens):
+    """Pick the highest ranked sentences that fit in token_budget, in document order"""
+    if not sentences:
+        return []
+    scores = _rescale(centrality(embeddings, method))
+    if keyword_pattern is not None:
+        scores = (1 - keyword_weight) * scores + keyword_weight * _rescale(keyword_density(sentences, keyword_pattern))
+
+    chosen = []
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        tokens = count_tokens(sentences[i])
+        if used + tokens > token_budget:
+            continue
+        chosen.append(i)
+        used += tokens
+    return [sentences[i] for i in sorted(chosen)]
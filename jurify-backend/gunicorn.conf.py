@@ -0,0 +1,15 @@
+"""Gunicorn settings picked up automatically from the working directory"""
+import os
+
+# MODEL_MODE=preload imports the app (and loads the models) once in the master,
+# so forked workers share the weights' pages copy-on-write instead of each
+# loading their own copy
+preload_app = os.getenv("MODEL_MODE", "local") == "preload"
+
+
+def post_worker_init(worker):
+    # Load (unless preloaded) and warm up models in the background so the
+    # worker answers /api/health right away and /api/ready once it can serve.
+    # Warm-up runs here, after the fork, never in the master
+    from app import models
+    models.start_loading()
@@ -0,0 +1,151 @@
+"""Bounded background job queue for document processing"""
+import queue
+import threading
+import time
+import uuid
+
+from telemetry import metrics
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class JobQueue:
+    """Runs jobs on a fixed pool of worker threads behind a bounded queue
+
+    `handler(*args, progress=callback)` is called for each job. The handler
+    reports stage changes with `progress(stage)`, or `progress(stage, fraction)`
+    when it knows how far along it is, and its return value becomes the job
+    result. Finished jobs are kept for `result_ttl` seconds.
+
+    Jobs run in the process that accepted them. With a `shared` ResultCache
+    every status change is also written there, so other worker processes
+    can report on the job; only the accepting process knows its queue position.
+    """
+
+    def __init__(self, handler, workers=2, max_queue=16, stages=(), result_ttl=3600, name="upload-jobs", shared=None):
+        self.handler = handler
+        self.name = name
+        self.shared = shared
+        self.workers = max(1, workers)
+        self.stages = list(stages)
+        self.result_ttl = result_ttl
+        self.queue = queue.Queue(maxsize=max(1, max_queue))
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        """Start the worker threads if they are not running yet"""
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, *args):
+        """Queue a job and return its id, or raise QueueFullError"""
+        self.start()
+        self._expire()
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        # Shared before a worker can pick it up, so "queued" never overwrites a later status
+        self._share(dict(job))
+        try:
+            self.queue.put_nowait((job_id, args))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            if self.shared is not None:
+                self.shared.delete(self._shared_key(job_id))
+            raise QueueFullError("Too many documents are being processed, try again shortly")
+        return job_id
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        self._expire()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            snapshot = None if job is None else dict(job)
+        if snapshot is None:
+            # Possibly accepted by another worker process
+            return None if self.shared is None else self.shared.get(self._shared_key(job_id))
+        if snapshot["status"] == "queued":
+            snapshot["position"] = self._position(job_id)
+        return snapshot
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return self.queue.qsize()
+
+    def _position(self, job_id):
+        with self.queue.mutex:
+            for position, (queued_id, _) in enumerate(self.queue.queue):
+                if queued_id == job_id:
+                    return position + 1
+        return 0
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            snapshot = dict(job)
+        self._share(snapshot)
+
+    def _shared_key(self, job_id):
+        return f"{self.name}:{job_id}"
+
+    def _share(self, job):
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(self._shared_key(job["id"]), job)
+        except Exception as e:
+            # The job still runs and this process can still report it
+            print(f"Could not share the status of job {job['id']}: {e}")
+
+    def _progress(self, job_id, stage, fraction=None):
+        if fraction is not None:
+            progress = fraction
+        elif stage in self.stages:
+            progress = self.stages.index(stage) / len(self.stages)
+        else:
+            progress = self.jobs[job_id]["progress"]
+        self._update(job_id, stage=stage, progress=progress)
+
+    def _work(self):
+        while True:
+            job_id, args = self.queue.get()
+            started = time.time()
+            self._update(job_id, status="running", started=started)
+            metrics.observe("jurify_queue_wait_seconds", started - self.jobs[job_id]["created"], queue=self.name)
+            try:
+                result = self.handler(*args, progress=lambda stage, fraction=None: self._progress(job_id, stage, fraction))
+            except Exception as e:
+                self._update(job_id, status="failed", error=str(e), finished=time.time())
+            else:
+                self._update(job_id, status="done", stage=None, progress=1.0, result=result, finished=time.time())
+            finally:
+                self.queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job["finished"] and job["finished"] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
@@ -0,0 +1,55 @@
+"""Inference server that owns the models for all web workers on a host
+
+Run `python model_server.py` next to gunicorn and start the workers with
+MODEL_MODE=server. Requests arrive as (method, args, kwargs) tuples over a
+Unix socket and are answered with (ok, result).
+"""
+import os
+import threading
+from multiprocessing.connection import Listener
+
+from models import MODEL_SERVER_AUTHKEY, MODEL_SERVER_SOCKET, LocalModels, warm_up, with_batching
+from profiles import profile_summarizers
+
+METHODS = ["tokenize", "generate", "encode", "embedding_dimension", "depth"]
+
+
+def handle(conn, models):
+    with conn:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            if method not in METHODS:
+                conn.send((False, f"Unknown method: {method}"))
+                continue
+            try:
+                conn.send((True, getattr(models, method)(*args, **kwargs)))
+            except Exception as e:
+                conn.send((False, str(e)))
+
+
+def serve(address=MODEL_SERVER_SOCKET, authkey=MODEL_SERVER_AUTHKEY):
+    print("Loading models...")
+    # Requests from all web workers meet here, so this is where batching pays off
+    models = with_batching(LocalModels())
+    warm_up(models, profile_summarizers())
+    print("Models loaded successfully!")
+
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        os.chmod(address, 0o600)
+        print(f"Model server listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Rejected model server connection: {e}")
+                continue
+            threading.Thread(target=handle, args=(conn, models), daemon=True).start()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,351 @@
+"""Model access for the backend, either in-process or through a shared model server
+
+MODEL_MODE selects how web workers reach the models:
+
+- "local": every process loads its own copy (default)
+- "preload": load once in the gunicorn master (`preload_app`); forked workers
+  share the weights' pages copy-on-write and warm up after the fork
+- "server": a separate `python model_server.py` process owns the models and
+  workers send requests over a Unix socket
+
+With MICRO_BATCHING on, concurrent generate and encode calls in the process
+that owns the models are merged into shared batches (see batching.py).
+
+Models are only read from the local Hugging Face cache unless
+MODELS_OFFLINE=false; fetch them ahead of time with `python models.py download`.
+"""
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Client
+
+import numpy as np
+
+from backends import EMBEDDER_BACKEND, SUMMARIZER_BACKEND, load_embedder, load_summarizer
+from batching import BatchingModels
+from chunking import encode_inputs, tokenize_sentences
+
+SUMMARIZER_NAME = os.getenv("SUMMARIZER_MODEL", "facebook/bart-large-cnn")
+# Distilled checkpoint of the "fast" generation profile; it must share the
+# summarizer's tokenizer, since chunks are passed as token ids
+FAST_SUMMARIZER_NAME = os.getenv("FAST_SUMMARIZER_MODEL", "sshleifer/distilbart-cnn-12-6")
+EMBEDDER_NAME = os.getenv("EMBEDDER_MODEL", "all-MiniLM-L6-v2")
+MODEL_MODE = os.getenv("MODEL_MODE", "local")
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/jurify-models.sock")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "jurify").encode("utf-8")
+
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "true").lower() == "true"
+GENERATE_BATCH_SIZE = int(os.getenv("GENERATE_BATCH_SIZE", "8"))
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Never reach the network while a worker starts up
+MODELS_OFFLINE = os.getenv("MODELS_OFFLINE", "true").lower() == "true"
+# Wait between background retries of a summarizer checkpoint that failed to load
+SUMMARIZER_RETRY_SECONDS = 60
+
+
+class LocalModels:
+    """Owns the summarizer and embedding models in this process"""
+
+    def __init__(self, local_files_only=MODELS_OFFLINE,
+                 summarizer_backend=SUMMARIZER_BACKEND, embedder_backend=EMBEDDER_BACKEND):
+        import torch
+
+        self.torch = torch
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.local_files_only = local_files_only
+        self.summarizer_backend = summarizer_backend
+        self.summarizer_model, self.summarizer_tokenizer = load_summarizer(
+            SUMMARIZER_NAME, summarizer_backend, self.device, local_files_only
+        )
+        self.summarizers = {SUMMARIZER_NAME: (self.summarizer_model, self.summarizer_tokenizer)}
+        self.summarizers_lock = threading.Lock()
+        self.summarizers_loading = set()
+        self.summarizers_failed = {}  # name -> monotonic time of the last failed load
+        self.embed_model = load_embedder(EMBEDDER_NAME, embedder_backend, self.device, local_files_only)
+
+    def load_summarizer(self, name):
+        """Load a summarization checkpoint now unless it is loaded; raises if it can't be"""
+        with self.summarizers_lock:
+            if name in self.summarizers:
+                return self.summarizers[name]
+            try:
+                self.summarizers[name] = load_summarizer(
+                    name, self.summarizer_backend, self.device, self.local_files_only
+                )
+            except Exception:
+                self.summarizers_failed[name] = time.monotonic()
+                raise
+            self.summarizers_failed.pop(name, None)
+            return self.summarizers[name]
+
+    def summarizer(self, name=None):
+        """(model, tokenizer) of a summarization checkpoint
+
+        Checkpoints are loaded up front (see load_summarizers). One that
+        isn't loaded yet is loaded in a background thread, never on the
+        generate thread, and the main summarizer stands in until it is; a
+        failed load is retried after SUMMARIZER_RETRY_SECONDS.
+        """
+        name = name or SUMMARIZER_NAME
+        summarizer = self.summarizers.get(name)
+        if summarizer is not None:
+            return summarizer
+        with self.summarizers_lock:
+            failed = self.summarizers_failed.get(name)
+            retry = failed is None or time.monotonic() - failed >= SUMMARIZER_RETRY_SECONDS
+            if name not in self.summarizers and name not in self.summarizers_loading and retry:
+                self.summarizers_loading.add(name)
+                threading.Thread(
+                    target=self._load_in_background, args=(name,), name="summarizer-loader", daemon=True
+                ).start()
+        return self.summarizers[SUMMARIZER_NAME]
+
+    def _load_in_background(self, name):
+        try:
+            self.load_summarizer(name)
+        except Exception as e:
+            print(f"Summarizer {name} unavailable ({e}), using {SUMMARIZER_NAME} for now")
+        finally:
+            with self.summarizers_lock:
+                self.summarizers_loading.discard(name)
+
+    def tokenize(self, sentences):
+        """Summarizer token ids of each sentence, for chunking.chunk_sentences"""
+        return tokenize_sentences(self.summarizer_tokenizer, list(sentences))
+
+    def generate(self, texts, max_input_length=1024, summarizer=None, **generation):
+        """Run a summarizer (SUMMARIZER_MODEL by default) over a batch of texts or chunks of token ids"""
+        if not texts:
+            return []
+        model, tokenizer = self.summarizer(summarizer)
+        inputs = encode_inputs(tokenizer, list(texts), max_input_length).to(self.device)
+        with self.torch.no_grad():
+            summary_ids = model.generate(**inputs, **generation)
+        return tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+    def encode(self, texts, batch_size=64):
+        """Return normalized float32 embeddings, one row per text"""
+        if not texts:
+            return np.zeros((0, self.embedding_dimension()), dtype=np.float32)
+        return self.embed_model.encode(
+            list(texts), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32, copy=False)
+
+    def embedding_dimension(self):
+        return self.embed_model.get_sentence_embedding_dimension()
+
+    def depth(self):
+        # Calls run as they arrive, nothing waits in a queue
+        return 0
+
+
+class RemoteModels:
+    """Client for model_server.py with the same methods as LocalModels"""
+
+    def __init__(self, address=MODEL_SERVER_SOCKET, authkey=MODEL_SERVER_AUTHKEY):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+        self._dimension = None
+
+    def _call(self, method, *args, **kwargs):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or getattr(self.local, "pid", None) != os.getpid():
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        try:
+            conn.send((method, args, kwargs))
+            ok, result = conn.recv()
+        except (EOFError, OSError):
+            # The server restarted; reconnect on the next call
+            self.local.conn = None
+            raise
+        if not ok:
+            raise RuntimeError(f"Model server error: {result}")
+        return result
+
+    def tokenize(self, sentences):
+        return self._call("tokenize", list(sentences))
+
+    def generate(self, texts, max_input_length=1024, **generation):
+        if not texts:
+            return []
+        return self._call("generate", list(texts), max_input_length=max_input_length, **generation)
+
+    def encode(self, texts, batch_size=64):
+        return self._call("encode", list(texts), batch_size=batch_size)
+
+    def embedding_dimension(self):
+        if self._dimension is None:
+            self._dimension = self._call("embedding_dimension")
+        return self._dimension
+
+    def depth(self):
+        """Generate requests waiting in the model server, from every worker"""
+        return self._call("depth")
+
+
+def with_batching(models):
+    """Wrap models in micro-batchers when MICRO_BATCHING is on"""
+    if not MICRO_BATCHING:
+        return models
+    return BatchingModels(
+        models,
+        generate_batch_size=GENERATE_BATCH_SIZE,
+        encode_batch_size=ENCODE_BATCH_SIZE,
+        max_wait=BATCH_MAX_WAIT_MS / 1000
+    )
+
+
+def load_models(mode=MODEL_MODE):
+    """Return the model backend for `mode`"""
+    if mode == "server":
+        # The server batches requests from every worker
+        return RemoteModels()
+    if mode in ["local", "preload"]:
+        return with_batching(LocalModels())
+    raise ValueError(f"Unknown MODEL_MODE: {mode}")
+
+
+def load_summarizers(models, names):
+    """Load extra summarization checkpoints now, so no request waits for them
+
+    A checkpoint that fails is logged and left to LocalModels.summarizer to
+    retry. Backends without load_summarizer (the model server's client,
+    stand-in models) load their own.
+    """
+    load = getattr(models, "load_summarizer", None)
+    if load is None:
+        return
+    for name in names:
+        if name != SUMMARIZER_NAME:
+            try:
+                load(name)
+            except Exception as e:
+                print(f"Summarizer {name} unavailable ({e}), using {SUMMARIZER_NAME} for now")
+
+
+def warm_up(models, summarizers=()):
+    """Run a tiny generate on every summarizer and an encode so the first real request isn't slow
+
+    `summarizers` are extra checkpoints to load (if needed) and warm up as well.
+    """
+    load_summarizers(models, summarizers)
+    for name in [SUMMARIZER_NAME, *(name for name in summarizers if name != SUMMARIZER_NAME)]:
+        models.generate(
+            ["This agreement is entered into by the parties."],
+            max_input_length=32, summarizer=name, max_length=8, min_length=1
+        )
+    models.encode(["Warm up."])
+
+
+class LazyModels:
+    """Loads the model backend on first use, or in the background via start_loading
+
+    Callers that arrive while loading is in progress wait for it to finish.
+    `state` is one of "not_loaded", "loading", "loaded" (not warmed up yet),
+    "warming_up", "ready" or "failed".
+    """
+
+    def __init__(self, mode=MODEL_MODE):
+        self.mode = mode
+        self.models = None
+        self.state = "not_loaded"
+        self.error = None
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def load(self, warm=True):
+        """Load the models if needed and, with `warm`, warm them up; returns them
+
+        Every checkpoint a generation profile may select is loaded too (see
+        profiles.profile_summarizers). MODEL_MODE=preload loads with
+        warm=False in the gunicorn master, so workers share those weights as
+        well: inference starts thread pools that don't survive fork, so each
+        worker warms up after it is forked (see gunicorn.conf.py).
+        """
+        from profiles import profile_summarizers
+
+        with self.lock:
+            if self.state == "ready" or (self.models is not None and not warm):
+                return self.models
+            self.error = None
+            try:
+                if self.models is None:
+                    print(f"Loading models ({self.mode} mode)...")
+                    self.state = "loading"
+                    self.models = load_models(self.mode)
+                    if self.mode == "preload":
+                        load_summarizers(self.models, profile_summarizers())
+                    self.state = "loaded"
+                if warm:
+                    self.state = "warming_up"
+                    warm_up(self.models, profile_summarizers())
+                    self.state = "ready"
+                    print("Models loaded successfully!")
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                print(f"Model loading failed: {e}")
+                raise
+            return self.models
+
+    def use(self, models):
+        """Serve from an already built backend, e.g. stand-in models for benchmarks"""
+        with self.lock:
+            self.models = models
+            self.state = "ready"
+            self.error = None
+
+    def start_loading(self):
+        """Load and warm up the models in a background thread"""
+        if self.state in ["not_loaded", "loaded", "failed"]:
+            self.state = "loading"
+            threading.Thread(target=self._load_in_background, name="model-loader", daemon=True).start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            pass
+
+    def tokenize(self, sentences):
+        return (self.models or self.load()).tokenize(sentences)
+
+    def generate(self, texts, max_input_length=1024, **generation):
+        return (self.models or self.load()).generate(texts, max_input_length=max_input_length, **generation)
+
+    def encode(self, texts, batch_size=64):
+        return (self.models or self.load()).encode(texts, batch_size=batch_size)
+
+    def embedding_dimension(self):
+        return (self.models or self.load()).embedding_dimension()
+
+    def depth(self):
+        """Generate requests waiting for the models, 0 before they are loaded"""
+        if self.models is None:
+            return 0
+        return getattr(self.models, "depth", lambda: 0)()
+
+
+def download_models():
+    """Fetch every model and data file the backend needs into the local caches"""
+    import nltk
+    # Also exports the ONNX models when an onnx backend is selected
+    LocalModels(local_files_only=False).load_summarizer(FAST_SUMMARIZER_NAME)
+    nltk.download("punkt", quiet=True)
+    nltk.download("punkt_tab", quiet=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["download"]:
+        download_models()
+    else:
+        print("Usage: python models.py download")
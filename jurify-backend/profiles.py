@@ -0,0 +1,76 @@
+"""Named generation profiles that trade summary quality for latency
+
+- "best": SUMMARIZER_MODEL with its own beam search (4 beams for
+  bart-large-cnn) and full-length outputs, the original settings
+- "balanced": the same model with 2 beams and outputs 20% shorter
+- "fast": FAST_SUMMARIZER_MODEL (distilbart-cnn-12-6) with greedy decoding
+  and outputs 40% shorter
+
+A profile adjusts each caller's base generate settings, so the Flask
+backend and the FastAPI service keep their own output lengths. Requests
+pick a profile; with AUTO_DEGRADE the server runs them on a cheaper one
+while the generate queue or the recent p95 latency is over its threshold.
+"""
+import os
+
+from models import FAST_SUMMARIZER_NAME, SUMMARIZER_NAME
+
+PROFILES = {
+    "best": {"summarizer": SUMMARIZER_NAME, "num_beams": None, "length_scale": 1.0},
+    "balanced": {"summarizer": SUMMARIZER_NAME, "num_beams": 2, "length_scale": 0.8},
+    "fast": {"summarizer": FAST_SUMMARIZER_NAME, "num_beams": 1, "length_scale": 0.6},
+}
+# From the highest quality to the lowest latency
+PROFILE_ORDER = ["best", "balanced", "fast"]
+
+GENERATION_PROFILE = os.getenv("GENERATION_PROFILE", "best")
+AUTO_DEGRADE = os.getenv("AUTO_DEGRADE", "true").lower() == "true"
+DEGRADE_QUEUE_DEPTH = int(os.getenv("DEGRADE_QUEUE_DEPTH", "8"))
+DEGRADE_P95_SECONDS = float(os.getenv("DEGRADE_P95_SECONDS", "30"))
+DEGRADE_WINDOW_SECONDS = int(os.getenv("DEGRADE_WINDOW_SECONDS", "60"))
+# Below this many samples in the window the p95 is just the slowest document
+DEGRADE_MIN_SAMPLES = int(os.getenv("DEGRADE_MIN_SAMPLES", "20"))
+
+
+def generation_settings(base, profile):
+    """Return (summarizer name, generate kwargs) for base settings run under a profile"""
+    settings = PROFILES[profile]
+    generation = dict(base)
+    for key in ["max_length", "min_length"]:
+        if key in generation:
+            generation[key] = max(1, round(generation[key] * settings["length_scale"]))
+    if settings["num_beams"]:
+        generation["num_beams"] = settings["num_beams"]
+    return settings["summarizer"], generation
+
+
+def profile_summarizers():
+    """Summarization checkpoints requests may run on without asking for a profile
+
+    Every profile's checkpoint with AUTO_DEGRADE, else GENERATION_PROFILE's.
+    These are loaded and warmed up with the models, so switching profiles
+    under load never waits for a checkpoint to load.
+    """
+    names = [PROFILES[name]["summarizer"] for name in (PROFILE_ORDER if AUTO_DEGRADE else [GENERATION_PROFILE])]
+    return list(dict.fromkeys(names))
+
+
+def choose_profile(requested=None, queue_depth=0, p95=None):
+    """The profile to run a request on
+
+    Starts from the requested profile (or GENERATION_PROFILE) and, with
+    AUTO_DEGRADE, moves one step cheaper when the queue depth or p95 latency
+    passes its threshold and two steps when it passes twice the threshold.
+    Raises ValueError for an unknown profile.
+    """
+    profile = requested or GENERATION_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown generation profile: {profile}. Choose one of {', '.join(PROFILE_ORDER)}")
+    if not AUTO_DEGRADE:
+        return profile
+
+    steps = 0
+    for value, threshold in [(queue_depth, DEGRADE_QUEUE_DEPTH), (p95, DEGRADE_P95_SECONDS)]:
+        if value is not None and threshold > 0:
+            steps = max(steps, 2 if value >= 2 * threshold else 1 if value >= threshold else 0)
+    return PROFILE_ORDER[min(PROFILE_ORDER.index(profile) + steps, len(PROFILE_ORDER) - 1)]
@@ -0,0 +1,64 @@
+"""Sentence-level diff between two versions of a document
+
+A revised upload is compared with its previous version sentence by
+sentence. Unchanged sentences let the pipeline reuse embeddings, chunk
+summaries and clause simplifications. The changed ones are grouped by
+clause type into a change summary.
+"""
+from difflib import SequenceMatcher
+
+
+def _opcodes(previous, current):
+    return SequenceMatcher(None, previous, current, autojunk=False).get_opcodes()
+
+
+def unchanged_sentences(previous, current):
+    """Map the index of every previous sentence that survived unchanged to its index in current"""
+    unchanged = {}
+    for tag, i1, i2, j1, j2 in _opcodes(previous, current):
+        if tag == "equal":
+            unchanged.update(zip(range(i1, i2), range(j1, j2)))
+    return unchanged
+
+
+def summarize_changes(previous, current, classify):
+    """Summarize what changed between two versions, given as lists of sentences
+
+    classify(sentence) returns the clause type of a sentence, or None.
+    Each clause type with added or removed sentences is reported as
+    "added" (not in the previous version), "removed" (gone from the current
+    one) or "modified", with the sentences concerned.
+    """
+    added, removed = [], []
+    for tag, i1, i2, j1, j2 in _opcodes(previous, current):
+        if tag != "equal":
+            removed.extend(previous[i1:i2])
+            added.extend(current[j1:j2])
+
+    clauses = {}
+    for key, sentences in [("added", added), ("removed", removed)]:
+        for sentence in sentences:
+            clause_type = classify(sentence)
+            if clause_type is not None:
+                clauses.setdefault(clause_type, {"added": [], "removed": []})[key].append(sentence)
+
+    previous_types = {classify(sentence) for sentence in previous}
+    current_types = {classify(sentence) for sentence in current}
+    summary = []
+    for clause_type, changes in clauses.items():
+        if clause_type not in previous_types:
+            status = "added"
+        elif clause_type not in current_types:
+            status = "removed"
+        else:
+            status = "modified"
+        summary.append({"type": clause_type, "status": status, **changes})
+
+    return {
+        "sentences": {
+            "unchanged": len(current) - len(added),
+            "added": len(added),
+            "removed": len(removed)
+        },
+        "clauses": summary
+    }
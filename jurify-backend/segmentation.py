@@ -0,0 +1,121 @@
+"""Sentence segmentation shared by summarization, clause extraction, chat and highlighting
+
+Only a sentence splitter runs, never a full tagging/parsing pipeline:
+
+- "nltk": the punkt tokenizer (default)
+- "spacy": spaCy's trained `senter` with every other component disabled, or
+  the rule-based `sentencizer` when no spaCy model is installed
+- "regex": split after ., ! or ?
+
+Sentence boundaries are cached per text, so every stage of a request reuses
+one segmentation. Nothing is downloaded; a backend whose data is missing
+falls back to the regex splitter.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+SEGMENTER = os.getenv("SEGMENTER", "nltk")
+SPACY_SEGMENTER_MODEL = os.getenv("SPACY_SEGMENTER_MODEL", "en_core_web_sm")
+SEGMENTATION_CACHE_SIZE = int(os.getenv("SEGMENTATION_CACHE_SIZE", "64"))
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # (backend, text) -> list of (start, end)
+_segmenters = {}
+
+
+def _regex_spans(text):
+    return [(m.start(), m.end()) for m in re.finditer(r"\S.*?(?:[.!?](?=\s|$)|$)", text, re.DOTALL)]
+
+
+def _load_punkt():
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        return PunktTokenizer("english")
+    except ImportError:
+        import nltk
+        return nltk.data.load("tokenizers/punkt/english.pickle")
+
+
+def _load_spacy():
+    import spacy
+    try:
+        nlp = spacy.load(SPACY_SEGMENTER_MODEL, exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"])
+        nlp.enable_pipe("senter")
+    except (OSError, ValueError):
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+    # Segmentation needs no length guard meant for the parser
+    nlp.max_length = 10 ** 8
+    return nlp
+
+
+def _segmenter(backend):
+    if backend not in _segmenters:
+        loader = {"nltk": _load_punkt, "spacy": _load_spacy}.get(backend)
+        try:
+            _segmenters[backend] = loader() if loader else None
+        except (ImportError, LookupError, OSError) as e:
+            print(f"Sentence segmenter '{backend}' unavailable ({type(e).__name__}), using regex")
+            _segmenters[backend] = None
+    return _segmenters[backend]
+
+
+def _segment(texts, backend):
+    segmenter = _segmenter(backend)
+    if segmenter is None:
+        return [_regex_spans(text) for text in texts]
+    if backend == "spacy":
+        return [
+            [(sent.start_char, sent.end_char) for sent in doc.sents]
+            for doc in segmenter.pipe(texts, batch_size=16)
+        ]
+    try:
+        return [list(segmenter.span_tokenize(text)) for text in texts]
+    except LookupError:
+        return [_regex_spans(text) for text in texts]
+
+
+def sentence_spans_many(texts, backend=None):
+    """Return (start, end) sentence offsets for each text, segmenting misses in one batch"""
+    backend = backend or SEGMENTER
+    results = {}
+    missing = []
+    with _lock:
+        for text in texts:
+            key = (backend, text)
+            if key in _cache:
+                _cache.move_to_end(key)
+                results[key] = _cache[key]
+            elif text not in missing:
+                missing.append(text)
+
+    if missing:
+        for text, spans in zip(missing, _segment(missing, backend)):
+            # Drop whitespace-only spans and trim the rest
+            trimmed = []
+            for start, end in spans:
+                segment = text[start:end]
+                if segment.strip():
+                    start += len(segment) - len(segment.lstrip())
+                    end -= len(segment) - len(segment.rstrip())
+                    trimmed.append((start, end))
+            results[(backend, text)] = trimmed
+        with _lock:
+            for text in missing:
+                _cache[(backend, text)] = results[(backend, text)]
+            while len(_cache) > SEGMENTATION_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return [results[(backend, text)] for text in texts]
+
+
+def sentence_spans(text, backend=None):
+    """Return (start, end) offsets of each sentence in text"""
+    return sentence_spans_many([text], backend)[0]
+
+
+def split_sentences(text, backend=None):
+    """Return the stripped sentences of text"""
+    return [text[start:end] for start, end in sentence_spans(text, backend)]
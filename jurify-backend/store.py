@@ -0,0 +1,136 @@
+"""Bounded document stores with memory accounting and LRU/TTL eviction"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from cache import ResultCache
+
+
+def estimate_size(value):
+    """Approximate the bytes held by a stored value"""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryDocumentStore:
+    """Per-process store bounded by estimated bytes, evicting least recently used first
+
+    `on_evict(doc_id)` is called for every document dropped by eviction or expiry.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=24 * 3600, on_evict=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.entries = OrderedDict()  # doc_id -> (value, size, created)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, doc_id):
+        return self.get(doc_id) is not None
+
+    def __getitem__(self, doc_id):
+        value = self.get(doc_id)
+        if value is None:
+            raise KeyError(doc_id)
+        return value
+
+    def __setitem__(self, doc_id, value):
+        size = estimate_size(value)
+        evicted = []
+        with self.lock:
+            if doc_id in self.entries:
+                self.total_bytes -= self.entries.pop(doc_id)[1]
+            self.entries[doc_id] = (value, size, time.time())
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                evicted.append(self._pop_oldest())
+        self._notify(evicted)
+
+    def __delitem__(self, doc_id):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(doc_id)[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, doc_id, default=None):
+        expired = []
+        with self.lock:
+            entry = self.entries.get(doc_id)
+            if entry is not None and self.ttl and entry[2] < time.time() - self.ttl:
+                self.total_bytes -= self.entries.pop(doc_id)[1]
+                expired.append(doc_id)
+                entry = None
+            elif entry is not None:
+                self.entries.move_to_end(doc_id)
+        self._notify(expired)
+        return default if entry is None else entry[0]
+
+    def _pop_oldest(self):
+        doc_id, (_, size, _) = self.entries.popitem(last=False)
+        self.total_bytes -= size
+        return doc_id
+
+    def _notify(self, doc_ids):
+        if self.on_evict:
+            for doc_id in doc_ids:
+                self.on_evict(doc_id)
+
+
+class SQLiteDocumentStore:
+    """Store shared by every worker process on the host, backed by a SQLite file
+
+    Lookups and inserts are primary-key operations; eviction uses the same
+    size bound and TTL rules as the result cache.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=24 * 3600, on_evict=None):
+        self.db = ResultCache(path, max_bytes=max_bytes, ttl=ttl)
+        self.on_evict = on_evict
+
+    def __contains__(self, doc_id):
+        return self.get(doc_id) is not None
+
+    def __getitem__(self, doc_id):
+        value = self.get(doc_id)
+        if value is None:
+            raise KeyError(doc_id)
+        return value
+
+    def __setitem__(self, doc_id, value):
+        evicted = self.db.set(doc_id, value)
+        if self.on_evict:
+            for evicted_id in evicted:
+                self.on_evict(evicted_id)
+
+    def __delitem__(self, doc_id):
+        self.db.delete(doc_id)
+
+    @property
+    def total_bytes(self):
+        return self.db.total_size()
+
+    def added_since(self, created):
+        """(doc_id, created) of the documents any worker stored at or after `created`, oldest first"""
+        return self.db.keys_since(created)
+
+    def get(self, doc_id, default=None):
+        value = self.db.get(doc_id)
+        return default if value is None else value
+
+
+def create_document_store(backend="memory", path=None, max_bytes=256 * 1024 * 1024, ttl=24 * 3600, on_evict=None):
+    """Build the document store selected by `backend` ("memory" or "sqlite")"""
+    if backend == "memory":
+        return MemoryDocumentStore(max_bytes=max_bytes, ttl=ttl, on_evict=on_evict)
+    if backend == "sqlite":
+        return SQLiteDocumentStore(path, max_bytes=max_bytes, ttl=ttl, on_evict=on_evict)
+    raise ValueError(f"Unknown document store backend: {backend}")
@@ -0,0 +1,164 @@
+"""Seeded generator of synthetic contracts in PDF, DOCX and TXT for benchmarks
+
+The same seed always produces the same documents, so benchmark runs on
+different machines or commits process identical input.
+"""
+import io
+import os
+import random
+
+PARTIES = [
+    ("Acme Holdings Ltd.", "the Company"), ("Northwind Traders LLC", "the Supplier"),
+    ("Blue River Consulting", "the Consultant"), ("Greenfield Properties Inc.", "the Landlord"),
+    ("Jordan Ellis", "the Tenant"), ("Orion Software GmbH", "the Licensor"),
+    ("Harbor Logistics Pvt. Ltd.", "the Customer"), ("Summit Health Partners", "the Client"),
+]
+
+CLAUSES = {
+    "Confidentiality": [
+        "{a} shall hold all Confidential Information of {b} in strict confidence and shall not disclose it to any third party without prior written consent.",
+        "The obligations of confidentiality shall survive termination of this Agreement for a period of {years} years.",
+        "Confidential Information does not include information that is or becomes publicly available through no breach by the receiving party.",
+    ],
+    "Payment": [
+        "{b} shall pay {a} a monthly fee of {amount} within {days} days of receipt of a valid invoice.",
+        "Late payments shall incur interest at {rate} percent per month on the outstanding amount until paid in full.",
+        "All payment obligations are exclusive of applicable taxes, which shall be borne by {b}.",
+    ],
+    "Termination": [
+        "Either party may terminate this Agreement upon {days} days written notice to the other party.",
+        "{a} may terminate this Agreement with immediate effect if {b} commits a material breach that is not cured within {days} days.",
+        "Upon termination, each party shall return all property and documents belonging to the other party.",
+    ],
+    "Liability": [
+        "In no event shall either party be liable for any indirect, incidental or consequential damages arising out of this Agreement.",
+        "The total liability of {a} under this Agreement shall not exceed the fees paid in the {months} months preceding the claim.",
+        "Nothing in this Agreement limits liability for fraud, gross negligence or wilful misconduct.",
+    ],
+    "Indemnification": [
+        "{b} shall indemnify and hold harmless {a} against all claims, losses and expenses arising from its breach of this Agreement.",
+        "The indemnified party shall give prompt notice of any claim and allow the indemnifying party to control its defence.",
+    ],
+    "Warranty": [
+        "{a} warrants that the services will be performed with reasonable skill and care in accordance with good industry practice.",
+        "Except as expressly stated, all warranties, whether express or implied, are excluded to the fullest extent permitted by law.",
+    ],
+    "Governing Law": [
+        "This Agreement shall be governed by and construed in accordance with the laws of {place}.",
+        "The courts of {place} shall have exclusive jurisdiction over any matter arising under this Agreement.",
+    ],
+    "Dispute Resolution": [
+        "Any dispute arising under this Agreement shall first be referred to senior representatives of both parties for resolution.",
+        "If the dispute is not resolved within {days} days, it shall be settled by binding arbitration seated in {place}.",
+    ],
+}
+
+FILLER = [
+    "The parties acknowledge that they have read and understood the terms set out in this section.",
+    "Headings are for convenience only and do not affect the interpretation of this Agreement.",
+    "Each party shall act in good faith in the performance of its obligations under this Agreement.",
+    "Any notice under this Agreement shall be in writing and delivered by hand, courier or email.",
+    "This section applies notwithstanding anything to the contrary elsewhere in this Agreement.",
+    "The schedules form part of this Agreement and have effect as if set out in full in the body of this Agreement.",
+    "No failure or delay in exercising any right shall operate as a waiver of that right.",
+    "This Agreement may be executed in any number of counterparts, each of which is an original.",
+]
+
+PLACES = ["England and Wales", "the State of New York", "Delaware", "Singapore", "New Delhi", "Ontario"]
+
+# About 450 words fill a printed page
+WORDS_PER_PAGE = 450
+
+FORMATS = ["pdf", "docx", "txt"]
+
+
+def generate_contract(rng, pages):
+    """Return (title, paragraphs) of a contract of roughly `pages` pages"""
+    (a, a_role), (b, b_role) = rng.sample(PARTIES, 2)
+    title = rng.choice(["Services Agreement", "Lease Agreement", "Software Licence Agreement",
+                        "Supply Agreement", "Consulting Agreement", "Non-Disclosure Agreement"])
+    values = {
+        "a": a_role.capitalize(), "b": b_role.capitalize(), "place": rng.choice(PLACES),
+        "days": rng.choice([7, 14, 30, 60, 90]), "months": rng.choice([3, 6, 12]),
+        "years": rng.choice([2, 3, 5]), "rate": rng.choice([1, 1.5, 2]),
+        "amount": f"${rng.randrange(1, 50) * 500:,}",
+    }
+    paragraphs = [
+        f"This {title} is made between {a} (\"{a_role}\") and {b} (\"{b_role}\").",
+        f"WHEREAS {a_role} wishes to engage {b_role} on the terms set out below, the parties agree as follows.",
+    ]
+    words = sum(len(p.split()) for p in paragraphs)
+    section = 1
+    while words < pages * WORDS_PER_PAGE:
+        heading = rng.choice(list(CLAUSES))
+        sentences = [s.format(**values) for s in CLAUSES[heading]]
+        sentences += rng.sample(FILLER, rng.randint(1, 4))
+        rng.shuffle(sentences)
+        paragraph = f"{section}. {heading}. " + " ".join(sentences)
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+        section += 1
+    return title, paragraphs
+
+
+def render_txt(title, paragraphs):
+    return (title.upper() + "\n\n" + "\n\n".join(paragraphs) + "\n").encode("utf-8")
+
+
+def render_docx(title, paragraphs):
+    from docx import Document
+
+    document = Document()
+    document.add_heading(title, level=1)
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def render_pdf(title, paragraphs):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    y = height - 50
+    for text, font, size in [(title, "Helvetica-Bold", 14)] + [(p, "Helvetica", 10) for p in paragraphs]:
+        for line in simpleSplit(text, font, size, width - 100) + [""]:
+            if y < 50:
+                c.showPage()
+                y = height - 50
+            c.setFont(font, size)
+            c.drawString(50, y, line)
+            y -= size + 4
+    c.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {"pdf": render_pdf, "docx": render_docx, "txt": render_txt}
+
+
+def build_corpus(count, seed=0, formats=None, pages=(1, 5, 20), out_dir=None):
+    """Generate `count` contracts cycling through formats, with page counts drawn from `pages`
+
+    Returns a list of dicts with name, format, pages and data (bytes). With
+    out_dir, each document is also written there.
+    """
+    rng = random.Random(seed)
+    formats = formats or FORMATS
+    corpus = []
+    for i in range(count):
+        fmt = formats[i % len(formats)]
+        page_count = rng.choice(pages)
+        title, paragraphs = generate_contract(rng, page_count)
+        data = RENDERERS[fmt](title, paragraphs)
+        name = f"contract_{seed}_{i:04d}.{fmt}"
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(data)
+        corpus.append({"name": name, "format": fmt, "pages": page_count, "data": data})
+    return corpus
@@ -0,0 +1,502 @@
+"""Per-request tracing spans, Prometheus metrics and an optional sampling profiler
+
+A trace covers one request (or one background job) on the current thread.
+Pipeline stages open spans inside it, and code deeper down adds token
+counts, batch sizes and cache hits to the innermost span with `annotate`
+and `count`. Every span also feeds the `jurify_stage_seconds` histogram,
+so stage latencies reach /api/metrics whether or not a trace is read.
+
+Finished traces are printed as one JSON line when TRACE_LOG is on. With
+PROFILING=true a request can ask for a sampling profile of its thread,
+written as collapsed stacks (flamegraph.pl / speedscope format).
+"""
+import functools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+TRACE_LOG = os.getenv("TRACE_LOG", "true").lower() == "true"
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "profiles"))
+# "sqlite" adds up the metrics of every process on the host, so any gunicorn
+# worker can answer a scrape; "memory" reports the answering process only
+METRICS_STORE = os.getenv("METRICS_STORE", "sqlite")
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "metrics.sqlite3"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+if METRICS_STORE not in ["memory", "sqlite"]:
+    raise ValueError(f"Unknown metrics store backend: {METRICS_STORE}")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_values (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, field)
+);
+CREATE TABLE IF NOT EXISTS gauge_values (
+    name TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    value REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, pid)
+);
+"""
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms in the Prometheus text format
+
+    Without a `path` metrics live in this process only. With one, each
+    process adds what it counted to a shared SQLite file every
+    `flush_seconds` (and before it renders), so render reports the sum over
+    every process on the host. Gauges are read in each process and combined
+    with their `aggregate` ("sum" or "max") over the processes that
+    published one within the last three flushes.
+    """
+
+    def __init__(self, path=None, flush_seconds=5):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.meta = {}  # name -> (type, help, buckets)
+        self.values = {}  # (name, labels) -> number, or [bucket counts, sum, count]; not flushed yet with a path
+        self.gauges = {}  # name -> (callable returning a number, aggregate)
+        self.local = threading.local()
+        self.pid = None
+
+    def counter(self, name, help_text):
+        self.meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauge(self, name, help_text, read, aggregate="sum"):
+        """Report read() at scrape time, combined over processes with `aggregate`"""
+        self.meta[name] = ("gauge", help_text, None)
+        self.gauges[name] = (read, aggregate)
+
+    def inc(self, name, value=1, **labels):
+        self._start()
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        self._start()
+        buckets = self.meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _start(self):
+        if self.path is None or self.pid == os.getpid():
+            return
+        with self.lock:
+            # Threads don't survive fork, so start one flusher per process
+            if self.pid != os.getpid():
+                if self.pid is not None:
+                    # Counted by the parent, which flushes them itself
+                    self.values = {}
+                self.pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or getattr(self.local, "pid", None) != os.getpid():
+            # Connections must not be shared across threads or forked processes
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(METRICS_SCHEMA)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def flush(self):
+        """Add this process's counts since the last flush to the shared file and publish its gauges"""
+        if self.path is None:
+            return
+        with self.lock:
+            values, self.values = self.values, {}
+        rows = []
+        for (name, labels), value in values.items():
+            labels = json.dumps(labels)
+            if isinstance(value, list):
+                counts, total, count = value
+                rows.extend((name, labels, str(bound), n) for bound, n in zip(self.meta[name][2], counts))
+                rows.extend([(name, labels, "sum", total), (name, labels, "count", count)])
+            else:
+                rows.append((name, labels, "value", value))
+        now = time.time()
+        gauges = []
+        for name, (read, _) in self.gauges.items():
+            try:
+                gauges.append((name, os.getpid(), read(), now))
+            except Exception:
+                pass
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO metric_values (name, labels, field, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (name, labels, field) DO UPDATE SET value = value + excluded.value",
+                    rows
+                )
+                conn.executemany("INSERT OR REPLACE INTO gauge_values (name, pid, value, updated) VALUES (?, ?, ?, ?)", gauges)
+                # Processes that stopped publishing have exited
+                conn.execute("DELETE FROM gauge_values WHERE updated < ?", (now - 3 * self.flush_seconds,))
+        except sqlite3.Error as e:
+            print(f"Metrics flush failed: {e}")
+            # Keep the counts for the next flush
+            with self.lock:
+                for key, value in values.items():
+                    current = self.values.get(key)
+                    if current is None:
+                        self.values[key] = value
+                    elif isinstance(value, list):
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                    else:
+                        self.values[key] = current + value
+
+    def _snapshot(self):
+        """(values, gauge readings) to render: this process's, or every process's with a path"""
+        if self.path is None:
+            with self.lock:
+                values = {key: (list(v[0]), v[1], v[2]) if isinstance(v, list) else v for key, v in self.values.items()}
+            gauges = {}
+            for name, (read, _) in self.gauges.items():
+                try:
+                    gauges[name] = read()
+                except Exception:
+                    pass
+            return values, gauges
+
+        self._start()
+        self.flush()
+        conn = self._connect()
+        fields = {}
+        for name, labels, field, value in conn.execute("SELECT name, labels, field, value FROM metric_values"):
+            key = (name, tuple(tuple(pair) for pair in json.loads(labels)))
+            fields.setdefault(key, {})[field] = value
+        values = {}
+        for (name, labels), entry in fields.items():
+            if name not in self.meta:
+                continue
+            buckets = self.meta[name][2]
+            if buckets is None:
+                values[(name, labels)] = _number(entry.get("value", 0))
+            else:
+                counts = [_number(entry.get(str(bound), 0)) for bound in buckets]
+                values[(name, labels)] = (counts, entry.get("sum", 0.0), _number(entry.get("count", 0)))
+        readings = {}
+        for name, value in conn.execute("SELECT name, value FROM gauge_values"):
+            readings.setdefault(name, []).append(value)
+        gauges = {}
+        for name, (_, aggregate) in self.gauges.items():
+            if name in readings:
+                gauges[name] = _number(max(readings[name]) if aggregate == "max" else sum(readings[name]))
+        return values, gauges
+
+    def render(self):
+        values, gauges = self._snapshot()
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self.meta.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "gauge":
+                if name in gauges:
+                    lines.append(f"{name} {gauges[name]}")
+                continue
+            for (metric, labels), value in sorted(values.items()):
+                if metric != name:
+                    continue
+                labels = dict(labels)
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                counts, total, count = value
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {bucket_count}")
+                lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(METRICS_PATH if METRICS_STORE == "sqlite" else None, METRICS_FLUSH_SECONDS)
+metrics.histogram("jurify_request_seconds", "HTTP request latency by endpoint")
+metrics.counter("jurify_requests_total", "HTTP requests by endpoint and status")
+metrics.histogram("jurify_stage_seconds", "Pipeline stage latency")
+metrics.counter("jurify_tokens_total", "Summarizer input tokens by stage")
+metrics.counter("jurify_cache_requests_total", "Result cache lookups by cache and result")
+metrics.histogram("jurify_queue_wait_seconds", "Time spent waiting in a queue before work started")
+metrics.histogram("jurify_batch_size", "Items per model call of a micro-batcher", SIZE_BUCKETS)
+metrics.histogram("jurify_batch_seconds", "Model call latency of a micro-batcher")
+metrics.counter("jurify_batch_documents_total", "Documents processed by batch ingestion by status")
+metrics.counter("jurify_generation_profile_total", "Requests by generation profile they ran on and whether it was lowered under load")
+
+
+class LatencyWindow:
+    """Durations observed over the last `seconds`, for a rolling percentile
+
+    Histograms count since startup; this answers "how slow is it right now".
+    """
+
+    def __init__(self, seconds=60, max_samples=2048):
+        self.seconds = seconds
+        self.samples = deque(maxlen=max_samples)  # (monotonic time, duration)
+        self.lock = threading.Lock()
+
+    def observe(self, duration):
+        with self.lock:
+            self.samples.append((time.monotonic(), duration))
+
+    def percentile(self, q, min_samples=1):
+        """The q-th percentile of recent durations, or None with fewer than min_samples"""
+        cutoff = time.monotonic() - self.seconds
+        with self.lock:
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            durations = sorted(duration for _, duration in self.samples)
+        if not durations or len(durations) < min_samples:
+            return None
+        return durations[min(len(durations) - 1, int(len(durations) * q / 100))]
+
+
+class InFlight:
+    """Number of requests being worked on right now: `with in_flight: ...`
+
+    Unlike a job queue's depth it also counts synchronous requests, which
+    never wait in a queue.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.count += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.count -= 1
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval and counts each stack"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Write collapsed stacks, one `frame;frame;... count` line each"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, value=1):
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class Trace:
+    """Spans recorded for one request on one thread"""
+
+    def __init__(self, name, parent=None, profile=False, **attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.spans = []
+        self.stack = []
+        self.start = time.perf_counter()
+        self.duration = None
+        self.profiler = SamplingProfiler(threading.get_ident()).start() if profile and PROFILING else None
+
+    def to_dict(self):
+        return {
+            "trace": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            **self.attrs,
+            "spans": self.spans,
+        }
+
+
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def begin_trace(name, parent=None, profile=False, **attrs):
+    """Start a trace on this thread; finish it with end_trace"""
+    trace = Trace(name, parent, profile, **attrs)
+    trace.previous = current_trace()
+    _local.trace = trace
+    return trace
+
+
+def end_trace(trace):
+    trace.duration = time.perf_counter() - trace.start
+    _local.trace = trace.previous
+    if trace.profiler:
+        trace.profiler.stop()
+        path = os.path.join(PROFILE_DIR, f"{trace.id}.folded")
+        trace.profiler.write(path)
+        trace.attrs["profile"] = path
+    if TRACE_LOG:
+        print(json.dumps(trace.to_dict(), default=str))
+
+
+class trace_context:
+    """`with trace_context(name, ...) as trace:` for work outside a request, e.g. background jobs"""
+
+    def __init__(self, name, parent=None, profile=False, **attrs):
+        self.args = (name, parent, profile)
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.trace = begin_trace(*self.args, **self.attrs)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.trace.attrs["error"] = exc_type.__name__
+        end_trace(self.trace)
+
+
+class span:
+    """Time a pipeline stage: `with span("extract_clauses") as s: ... s.set(clauses=3)`"""
+
+    def __init__(self, name, **attrs):
+        self.span = Span(name, attrs)
+
+    def __enter__(self):
+        self.trace = current_trace()
+        if self.trace is not None:
+            self.depth = len(self.trace.stack)
+            self.trace.stack.append(self.span)
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        metrics.observe("jurify_stage_seconds", duration, stage=self.span.name)
+        if exc_type is not None:
+            self.span.attrs["error"] = exc_type.__name__
+        if self.trace is not None:
+            self.trace.stack.pop()
+            self.trace.spans.append({
+                "name": self.span.name,
+                "depth": self.depth,
+                "start_ms": round((self.start - self.trace.start) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+                **self.span.attrs,
+            })
+
+
+def traced(fn):
+    """Run every call of fn inside a span named after it"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _innermost():
+    trace = current_trace()
+    if trace is None:
+        return None
+    return trace.stack[-1] if trace.stack else trace
+
+
+def annotate(**attrs):
+    """Set attributes on the innermost open span of this thread, or on its trace"""
+    target = _innermost()
+    if target is not None:
+        target.attrs.update(attrs)
+
+
+def count(key, value=1):
+    """Add to a counter attribute of the innermost open span of this thread, or of its trace"""
+    target = _innermost()
+    if target is not None:
+        target.attrs[key] = target.attrs.get(key, 0) + value
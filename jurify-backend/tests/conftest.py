@@ -0,0 +1,52 @@
+"""Run the app against the benchmark's stand-in models, so tests need no weights"""
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read at import time, so set before the app is imported
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+os.environ.setdefault("RESULT_CACHE_MAX_MB", "0")
+os.environ.setdefault("METRICS_PATH", os.path.join(tempfile.mkdtemp(), "metrics.sqlite3"))
+os.environ.setdefault("SUMMARY_CHUNK_TOKENS", "40")
+os.environ.setdefault("MAX_SUMMARY_CHUNKS", "0")
+os.environ.setdefault("SEGMENTER", "regex")
+os.environ.setdefault("TRACE_LOG", "false")
+
+import benchmark
+
+
+class RecordingModels(benchmark.FakeModels):
+    """FakeModels that remember every generate call"""
+
+    def __init__(self, generate_ms_per_token=0.0, encode_ms_per_text=0.0):
+        super().__init__(generate_ms_per_token, encode_ms_per_text, dimension=32)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate(self, texts, max_input_length=1024, **generation):
+        with self.lock:
+            self.calls.append((list(texts), max_input_length, generation))
+        return super().generate(texts, max_input_length, **generation)
+
+    def summary_inputs(self):
+        """Chunks sent to generate for document summaries, as opposed to clause sentences"""
+        return [text for texts, max_input_length, _ in self.calls if max_input_length == 1024 for text in texts]
+
+
+@pytest.fixture
+def fake_models():
+    import app
+    models = RecordingModels()
+    app.models.use(models)
+    return models
+
+
+@pytest.fixture
+def client(fake_models):
+    import app
+    return app.app.test_client()
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from batching import MicroBatcher
+
+
+class Recorder:
+    """Batch function that remembers each call and tags every result with its params"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items, **params):
+        with self.lock:
+            self.calls.append((list(items), params))
+        return [f"{item}:{params.get('beams')}" for item in items]
+
+
+def test_requests_with_the_same_params_share_a_batch():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait=0.2)
+    futures = [batcher.submit([f"a{i}", f"b{i}"], beams=4) for i in range(3)]
+
+    assert [future.result() for part in futures for future in part] == [
+        ["a0:4", "b0:4"], ["a1:4", "b1:4"], ["a2:4", "b2:4"]
+    ]
+    assert fn.calls == [(["a0", "b0", "a1", "b1", "a2", "b2"], {"beams": 4})]
+
+
+def test_mixed_params_are_never_merged():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait=0.2)
+    results = {}
+
+    def call(name, beams):
+        results[name] = batcher([f"{name}-{i}" for i in range(3)], beams=beams)
+
+    threads = [threading.Thread(target=call, args=(name, beams)) for name, beams in [("x", 1), ("y", 4), ("z", 1)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every caller gets its own items back, run with its own params
+    assert results == {name: [f"{name}-{i}:{beams}" for i in range(3)] for name, beams in [("x", 1), ("y", 4), ("z", 1)]}
+    for items, params in fn.calls:
+        assert {item.split("-")[0] for item in items} <= ({"x", "z"} if params["beams"] == 1 else {"y"})
+
+
+def test_oversized_requests_are_split_and_reassembled():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait=0.01)
+    items = [str(i) for i in range(10)]
+    assert batcher(items, beams=2) == [f"{i}:2" for i in items]
+    assert [len(items) for items, _ in fn.calls] == [4, 4, 2]
+
+
+def test_a_lone_request_waits_at_most_max_wait():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait=0.1)
+    batcher(["warm up"])
+    started = time.monotonic()
+    assert batcher(["alone"]) == ["alone:None"]
+    assert time.monotonic() - started < 0.1 + 0.1
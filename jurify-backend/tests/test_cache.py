@@ -0,0 +1,44 @@
+import io
+
+import app
+import cache
+from cache import ResultCache, content_key
+
+TEXT = " ".join(f"Clause {i} says the tenant shall pay rent {i} on the first day of each month." for i in range(8))
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "TOUCH_INTERVAL", 0)
+    results = ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=300)
+    results.set("a", b"x" * 100)
+    results.set("b", b"y" * 100)
+    assert results.get("a") == b"x" * 100
+
+    assert results.set("c", b"z" * 100) == ["b"]
+    assert (results.get("a"), results.get("b"), results.get("c")) == (b"x" * 100, None, b"z" * 100)
+    assert results.total_size() <= 300
+
+
+def test_expired_entries_miss_and_are_evicted(tmp_path):
+    results = ResultCache(str(tmp_path / "results.sqlite3"), ttl=60)
+    results.set("old", "value")
+    results.set("new", "value")
+    results._connect().execute("UPDATE entries SET created = created - 120 WHERE key = 'old'")
+
+    assert (results.get("old"), results.get("new")) == (None, "value")
+    assert results.set("newer", "value") == ["old"]
+
+
+def test_changing_the_pipeline_settings_invalidates_cached_results(fake_models, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "result_cache", ResultCache(str(tmp_path / "results.sqlite3")))
+    client = app.app.test_client()
+
+    def upload():
+        before = len(fake_models.calls)
+        client.post("/api/upload", data={"file": (io.BytesIO(TEXT.encode("utf-8")), "lease.txt")})
+        return len(fake_models.calls) - before
+
+    assert upload() > 0
+    assert upload() == 0
+    monkeypatch.setattr(app, "CONFIG_FINGERPRINT", content_key("another", "summarizer"))
+    assert upload() > 0
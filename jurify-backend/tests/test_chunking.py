@@ -0,0 +1,84 @@
+from chunking import pack_chunks, pack_revision
+from revisions import unchanged_sentences
+
+
+def sentences(*lengths, start=0):
+    """Sentences of distinct token ids with the given lengths"""
+    ids = []
+    for length in lengths:
+        ids.append(tuple(range(start, start + length)))
+        start += length
+    return ids
+
+
+# Short sentences, and ones longer than the 12 token budget, cut into windows
+DOCUMENT = sentences(5, 4, 30, 3, 6, 7, 2, 15, 5, 8, 4, 26, 3)
+
+
+def revise(previous, current, overlap_tokens, even=True):
+    return pack_revision(current, previous, unchanged_sentences(previous, current), 12, overlap_tokens, even)
+
+
+def test_unchanged_document_gets_the_chunks_of_pack_chunks():
+    for overlap_tokens in [0, 3, 6]:
+        for even in [True, False]:
+            chunks, kept = revise(DOCUMENT, DOCUMENT, overlap_tokens, even)
+            expected = pack_chunks(DOCUMENT, 12, overlap_tokens, even)
+            assert (chunks, kept) == (expected, len(expected))
+
+
+def test_prefix_edit_keeps_the_later_chunks():
+    for overlap_tokens in [0, 3]:
+        revised = sentences(9, start=1000) + DOCUMENT[1:]
+        chunks, kept = revise(DOCUMENT, revised, overlap_tokens)
+        previous = pack_chunks(DOCUMENT, 12, overlap_tokens)
+
+        assert kept == len(previous) - 1
+        assert chunks[-kept:] == previous[-kept:]
+        assert all(len(chunk) <= 12 for chunk in chunks)
+        assert chunks[0][:9] == list(range(1000, 1009))
+
+
+def test_mid_edit_only_repacks_around_the_change():
+    for overlap_tokens in [0, 3]:
+        revised = DOCUMENT[:6] + sentences(10, start=1000) + DOCUMENT[7:]
+        chunks, kept = revise(DOCUMENT, revised, overlap_tokens)
+        previous = pack_chunks(DOCUMENT, 12, overlap_tokens)
+
+        # One chunk held the replaced sentence, two new ones take its place
+        assert (kept, len(chunks)) == (len(previous) - 1, len(previous) + 1)
+        assert [chunk for chunk in chunks if chunk in previous] == [chunk for chunk in previous if chunk in chunks]
+        assert all(len(chunk) <= 12 for chunk in chunks)
+        # Every token of the revision is summarized, in order
+        tokens = iter(token for chunk in chunks for token in chunk)
+        assert all(token in tokens for sentence in revised for token in sentence)
+
+
+def test_even_packing_spreads_tokens_over_the_fewest_chunks():
+    document = sentences(*[5] * 20)
+    assert [len(chunk) for chunk in pack_chunks(document, 40)] == [35, 35, 30]
+    assert [len(chunk) for chunk in pack_chunks(document, 40, even=False)] == [40, 40, 20]
+
+
+def test_chunks_stay_within_budget_and_overlap_whole_sentences():
+    for even in [True, False]:
+        chunks = pack_chunks(DOCUMENT, 12, overlap_tokens=4, even=even)
+        assert all(len(chunk) <= 12 for chunk in chunks)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            # What a chunk repeats is a tail of the one before, at most 4 tokens
+            shared = next(size for size in range(min(len(previous), len(chunk)), -1, -1)
+                          if previous[len(previous) - size:] == chunk[:size])
+            assert shared <= 4
+        assert [token for chunk in pack_chunks(DOCUMENT, 12, even=even) for token in chunk] == \
+            [token for sentence in DOCUMENT for token in sentence]
+
+
+def test_spans_are_the_sentences_each_chunk_draws_from():
+    chunks, spans = pack_chunks(DOCUMENT, 12, overlap_tokens=3, spans=True)
+    for chunk, (start, end) in zip(chunks, spans):
+        tokens = [token for sentence in DOCUMENT[start:end] for token in sentence]
+        # Whole sentences, or windows of the first and last one
+        assert chunk[0] in DOCUMENT[start] and chunk[-1] in DOCUMENT[end - 1]
+        assert chunk == tokens[tokens.index(chunk[0]):tokens.index(chunk[-1]) + 1]
+    assert spans[0][0] == 0 and spans[-1][1] == len(DOCUMENT)
+    assert all(a[0] <= b[0] and a[1] <= b[1] for a, b in zip(spans, spans[1:]))
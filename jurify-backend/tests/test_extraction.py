@@ -0,0 +1,21 @@
+import random
+
+import extraction
+from synthetic_corpus import generate_contract, render_pdf
+
+
+def test_pool_yields_the_same_pages_in_order(monkeypatch):
+    data = render_pdf(*generate_contract(random.Random(0), 30))
+    monkeypatch.setattr(extraction, "PARALLEL_PAGE_THRESHOLD", 10 ** 9)
+    sequential = list(extraction.iter_pdf_pages(data))
+
+    monkeypatch.setattr(extraction, "PARALLEL_PAGE_THRESHOLD", 2)
+    monkeypatch.setattr(extraction, "EXTRACTION_PROCESSES", 2)
+    monkeypatch.setattr(extraction, "PAGES_PER_TASK", 3)
+    pages = extraction.iter_pdf_pages(data)
+    # Pages arrive one range at a time, the rest can be abandoned
+    assert next(pages) == sequential[0]
+    pages.close()
+
+    assert list(extraction.iter_pdf_pages(data)) == sequential
+    assert extraction.extract_text(data, "pdf") == "".join(page + "\n" for page in sequential if page)
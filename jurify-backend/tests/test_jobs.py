@@ -0,0 +1,47 @@
+import threading
+import time
+
+from cache import ResultCache
+from jobs import JobQueue
+
+
+def wait_for_status(jobs, job_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = jobs.get(job_id)
+        if job is not None and job["status"] == status:
+            return job
+        assert time.monotonic() < deadline, f"job never reached {status}: {job}"
+        time.sleep(0.01)
+
+
+def test_other_processes_see_job_status_through_the_shared_store(tmp_path):
+    shared = ResultCache(str(tmp_path / "jobs.sqlite3"))
+    release = threading.Event()
+
+    def handler(value, progress):
+        progress("working", 0.5)
+        release.wait(10)
+        return {"value": value * 2}
+
+    # Two queues on one store stand in for two gunicorn workers
+    accepting = JobQueue(handler, workers=1, stages=["working"], shared=shared)
+    other = JobQueue(handler, workers=1, stages=["working"], shared=shared)
+
+    job_id = accepting.submit(21)
+    running = wait_for_status(other, job_id, "running")
+    assert (running["stage"], running["progress"]) == ("working", 0.5)
+
+    release.set()
+    assert wait_for_status(other, job_id, "done")["result"] == {"value": 42}
+    assert other.get("unknown") is None
+
+
+def test_jobs_of_different_queues_do_not_collide(tmp_path):
+    shared = ResultCache(str(tmp_path / "jobs.sqlite3"))
+    uploads = JobQueue(lambda progress: "upload", shared=shared)
+    batches = JobQueue(lambda progress: "batch", shared=shared, name="batch-jobs")
+
+    job_id = uploads.submit()
+    wait_for_status(uploads, job_id, "done")
+    assert batches.get(job_id) is None
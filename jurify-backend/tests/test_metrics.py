@@ -0,0 +1,54 @@
+import multiprocessing
+
+import pytest
+
+from telemetry import Metrics
+
+
+def make_metrics(path):
+    metrics = Metrics(path, flush_seconds=60)
+    metrics.counter("jobs_total", "Jobs")
+    metrics.histogram("job_seconds", "Job latency", buckets=(1, 10))
+    metrics.gauge("queue_depth", "Queued jobs", lambda: 2)
+    return metrics
+
+
+def record(path):
+    metrics = make_metrics(path)
+    metrics.inc("jobs_total", 3, status="done")
+    metrics.observe("job_seconds", 5)
+    metrics.flush()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_metrics_add_up_across_processes(tmp_path):
+    path = str(tmp_path / "metrics.sqlite3")
+    metrics = make_metrics(path)
+    metrics.inc("jobs_total", status="done")
+    metrics.observe("job_seconds", 0.5)
+
+    worker = multiprocessing.get_context("fork").Process(target=record, args=(path,))
+    worker.start()
+    worker.join()
+
+    lines = metrics.render().splitlines()
+    assert 'jobs_total{status="done"} 4' in lines
+    assert 'job_seconds_bucket{le="1"} 1' in lines
+    assert 'job_seconds_bucket{le="10"} 2' in lines
+    assert "job_seconds_count 2" in lines
+    assert "job_seconds_sum 5.5" in lines
+    # Both processes published a gauge reading
+    assert "queue_depth 4" in lines
+
+    # Counts were moved to the file, rendering again doesn't add them twice
+    assert 'jobs_total{status="done"} 4' in metrics.render().splitlines()
+
+
+def test_metrics_in_memory():
+    metrics = make_metrics(None)
+    metrics.inc("jobs_total", 2, status="done")
+    metrics.observe("job_seconds", 20)
+    lines = metrics.render().splitlines()
+    assert 'jobs_total{status="done"} 2' in lines
+    assert 'job_seconds_bucket{le="+Inf"} 1' in lines
+    assert "queue_depth 2" in lines
@@ -0,0 +1,43 @@
+import models
+import profiles
+from conftest import RecordingModels
+from models import FAST_SUMMARIZER_NAME, SUMMARIZER_NAME, LazyModels, warm_up
+
+
+class CheckpointModels(RecordingModels):
+    """RecordingModels that remember which extra checkpoints were loaded"""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded = []
+
+    def load_summarizer(self, name):
+        self.loaded.append(name)
+
+
+def test_warm_up_loads_and_warms_every_profile_checkpoint(monkeypatch):
+    monkeypatch.setattr(profiles, "AUTO_DEGRADE", True)
+    fake = CheckpointModels()
+    warm_up(fake, profiles.profile_summarizers())
+
+    assert fake.loaded == [FAST_SUMMARIZER_NAME]
+    assert [generation["summarizer"] for _, _, generation in fake.calls] == [SUMMARIZER_NAME, FAST_SUMMARIZER_NAME]
+
+
+def test_preload_loads_profile_checkpoints_before_the_fork(monkeypatch):
+    monkeypatch.setattr(profiles, "AUTO_DEGRADE", True)
+    fake = CheckpointModels()
+    monkeypatch.setattr(models, "load_models", lambda mode: fake)
+    lazy = LazyModels("preload")
+    lazy.load(warm=False)
+
+    # Loaded in the master, but nothing runs until a worker warms up
+    assert (lazy.state, fake.loaded, fake.calls) == ("loaded", [FAST_SUMMARIZER_NAME], [])
+
+
+def test_profile_summarizers_without_auto_degrade(monkeypatch):
+    monkeypatch.setattr(profiles, "AUTO_DEGRADE", False)
+    monkeypatch.setattr(profiles, "GENERATION_PROFILE", "balanced")
+    assert profiles.profile_summarizers() == [SUMMARIZER_NAME]
+    monkeypatch.setattr(profiles, "GENERATION_PROFILE", "fast")
+    assert profiles.profile_summarizers() == [FAST_SUMMARIZER_NAME]
@@ -0,0 +1,64 @@
+import io
+import threading
+import time
+
+from werkzeug.datastructures import FileStorage
+
+import app
+import profiles
+
+TEXT = " ".join(f"Section {i} says the buyer shall pay invoice {i} within thirty days of delivery." for i in range(8))
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_sync_uploads_degrade_the_profile(fake_models, monkeypatch):
+    monkeypatch.setattr(profiles, "DEGRADE_QUEUE_DEPTH", 1)
+    monkeypatch.setattr(profiles, "DEGRADE_P95_SECONDS", 0)
+    release = threading.Event()
+    generate = fake_models.generate
+    monkeypatch.setattr(fake_models, "generate", lambda *args, **kwargs: release.wait(10) and generate(*args, **kwargs))
+
+    responses = [None] * 3
+
+    def upload(i):
+        client = app.app.test_client()
+        data = {"file": (io.BytesIO(f"{TEXT} Copy {i}.".encode("utf-8")), f"contract-{i}.txt")}
+        responses[i] = client.post("/api/upload", data=data).json
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(3)]
+    # Start the uploads one at a time so each one sees the others in flight
+    for i, thread in enumerate(threads):
+        thread.start()
+        wait_for(lambda: app.in_flight.count == i + 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert [response["profile"] for response in responses] == ["best", "balanced", "fast"]
+    assert app.in_flight.count == 0
+
+
+def test_one_slow_document_does_not_degrade(client, monkeypatch):
+    monkeypatch.setattr(profiles, "DEGRADE_P95_SECONDS", 30)
+    monkeypatch.setattr(app, "recent_latency", app.LatencyWindow(60))
+    app.recent_latency.observe(120)
+    assert app.pick_profile() == "best"
+
+    for _ in range(profiles.DEGRADE_MIN_SAMPLES):
+        app.recent_latency.observe(120)
+    assert app.pick_profile() == "fast"
+
+
+def test_batches_and_uploads_pick_before_counting_themselves(fake_models, monkeypatch):
+    monkeypatch.setattr(profiles, "DEGRADE_QUEUE_DEPTH", 1)
+    monkeypatch.setattr(profiles, "DEGRADE_P95_SECONDS", 0)
+    with app.app.test_request_context():
+        result = app.run_batch_job([("batch.txt", f"{TEXT} Batch.".encode("utf-8"))])
+        upload = app.process_document(FileStorage(io.BytesIO(f"{TEXT} Upload.".encode("utf-8")), "upload.txt"))
+    assert (result["profile"], upload["profile"]) == ("best", "best")
@@ -0,0 +1,32 @@
+import io
+
+import app
+
+SENTENCES = [f"Clause {i} says the tenant shall keep the premises number {i} in good repair at all times." for i in range(40)]
+
+
+def upload(client, text, **form):
+    response = client.post("/api/upload", data={"file": (io.BytesIO(text.encode("utf-8")), "lease.txt"), **form})
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def test_revision_reuses_stored_chunk_summaries_without_result_cache(client, fake_models):
+    assert app.RESULT_CACHE_MAX_MB == 0
+    first = upload(client, " ".join(SENTENCES))
+    first_chunks = len(fake_models.summary_inputs())
+    assert first_chunks > 3
+
+    fake_models.calls.clear()
+    revised = SENTENCES[:-1] + ["Clause 39 now says the landlord handles every repair."]
+    second = upload(client, " ".join(revised), previousDocumentId=first["documentId"])
+
+    assert second["version"] == 2
+    # Only the chunk holding the changed last sentence goes through generate
+    assert len(fake_models.summary_inputs()) == 1
+
+
+def test_document_response_hides_chunk_summaries(client, fake_models):
+    document_id = upload(client, " ".join(SENTENCES))["documentId"]
+    data = client.get(f"/api/document/{document_id}").json["data"]
+    assert "summaries" not in data and "index" not in data
@@ -0,0 +1,49 @@
+import io
+
+import app
+from store import create_document_store
+
+TEXT = " ".join(f"Article {i} states that the licensee shall pay royalty number {i} every quarter." for i in range(6))
+
+
+def upload(client, text, filename="license.txt"):
+    response = client.post("/api/upload", data={"file": (io.BytesIO(text.encode("utf-8")), filename)})
+    assert response.status_code == 200, response.json
+    return response.json["documentId"]
+
+
+def search(client, **body):
+    return client.post("/api/search", json={"query": "royalty number 3 every quarter", **body})
+
+
+def test_reuploads_do_not_duplicate_search_results(client):
+    upload(client, TEXT)
+    latest = upload(client, TEXT, "license-copy.txt")
+
+    results = [result for result in search(client, topK=100).json["results"] if "royalty number" in result["passage"]]
+    passages = [result["passage"] for result in results]
+    assert len(passages) == len(set(passages)) == 6
+    assert all(result["documentId"] == latest for result in results)
+
+
+def test_invalid_top_k_is_a_bad_request(client):
+    for top_k in ["5", 0, 2.5, True, None, 101]:
+        assert search(client, topK=top_k).status_code == 400
+    assert search(client, documentIds="abc").status_code == 400
+    assert search(client, topK=3).status_code == 200
+    assert search(client, topK=100).status_code == 200
+
+
+def test_search_covers_documents_stored_by_other_workers(client, monkeypatch, tmp_path):
+    shared = create_document_store("sqlite", path=str(tmp_path / "documents.sqlite3"), on_evict=app.corpus_index.remove)
+    monkeypatch.setattr(app, "DOCUMENT_STORE", "sqlite")
+    monkeypatch.setattr(app, "document_store", shared)
+    monkeypatch.setattr(app, "corpus_synced", 0.0)
+
+    # Another worker's upload: in the shared store, not in this process's index
+    other = TEXT.replace("royalty", "stipend")
+    index = app.build_passage_index(other)
+    shared["from-other-worker"] = {"filename": "other.txt", "index": index, "corpusKey": app.corpus_key(other)}
+
+    results = client.post("/api/search", json={"query": "stipend number 2", "topK": 3}).json["results"]
+    assert results[0]["documentId"] == "from-other-worker"
@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+
+def embeddings(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_documents_with_the_same_source_share_their_passages():
+    index = VectorIndex()
+    vectors = embeddings(3)
+    passages = ["a", "b", "c"]
+    index.add("first", passages, vectors, source="contract")
+    index.add("second", passages, vectors, source="contract")
+
+    assert len(index) == 3
+    results = index.search(vectors[0], top_k=10)
+    assert [passage for _, passage, _ in results].count("a") == 1
+    assert results[0][0] == "second"
+    assert index.search(vectors[0], top_k=1, doc_ids=["first"])[0][0] == "first"
+
+    index.remove("second")
+    assert index.search(vectors[0], top_k=1)[0][0] == "first"
+    index.remove("first")
+    assert len(index) == 0 and index.search(vectors[0]) == []
+
+
+def test_compaction_keeps_the_rows_of_live_sources():
+    index = VectorIndex()
+    for i in range(8):
+        index.add(f"doc-{i}", [f"{i}-{j}" for j in range(4)], embeddings(4, seed=i))
+    for i in range(5):
+        index.remove(f"doc-{i}")
+
+    assert (index.size, index.dead) == (12, 0)  # Compacted whenever more than a quarter was dead
+    query = embeddings(4, seed=6)[2]
+    assert index.search(query, top_k=1)[0][:2] == ("doc-6", "6-2")
+
+
+def test_ivf_search_finds_exact_matches_after_training():
+    index = VectorIndex(ivf_lists=4, ivf_min_rows=200, nprobe=4)
+    vectors = embeddings(400)
+    for i in range(0, 400, 50):
+        index.add(f"doc-{i}", [str(row) for row in range(i, i + 50)], vectors[i:i + 50])
+
+    assert index.centroids is not None and not index.training
+    assert index.search(vectors[123], top_k=1)[0][1] == "123"
+
+
+def test_adds_during_training_are_assigned_to_clusters():
+    index = VectorIndex(ivf_lists=4, ivf_min_rows=100, nprobe=4)
+    vectors = embeddings(300)
+    index.add("base", [str(row) for row in range(100)], vectors[:100])
+    index.centroids = None
+    index.trained_size = 0
+
+    threads = [
+        threading.Thread(target=index.add, args=(f"doc-{i}", [str(row) for row in range(i, i + 50)], vectors[i:i + 50]))
+        for i in range(100, 300, 50)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert index.centroids is not None
+    for row in [5, 150, 299]:
+        assert index.search(vectors[row], top_k=1)[0][1] == str(row)
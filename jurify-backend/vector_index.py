@@ -0,0 +1,241 @@
+"""Corpus-wide passage index for semantic search across documents"""
+import threading
+
+import numpy as np
+
+# Rows converted to float32 at a time when scanning float16 storage
+SCAN_BLOCK_ROWS = 65536
+
+
+def kmeans(vectors, k, iterations=10, seed=0):
+    """Spherical k-means on normalized vectors, returns normalized centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors.dot(centroids.T), axis=1)
+        for c in range(k):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays useful
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        centroids /= norms
+    return centroids
+
+
+class VectorIndex:
+    """Normalized passage embeddings from many documents in one contiguous matrix
+
+    Rows are appended per source and tombstoned on removal; the matrix is
+    compacted once a quarter of it is dead. Documents added with the same
+    `source` (e.g. identical uploads) share one set of rows, so search
+    returns each passage once. Search is a brute-force dot product until
+    the index holds `ivf_min_rows` rows, after which rows are partitioned
+    into `ivf_lists` k-means clusters (IVF) and only the `nprobe` clusters
+    closest to the query are scanned. Clusters are trained outside the lock,
+    so searches and adds go on meanwhile.
+    """
+
+    def __init__(self, dtype=np.float32, ivf_lists=0, ivf_min_rows=50000, nprobe=8):
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self.vectors = None
+        self.size = 0
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_sources = []
+        self.row_passages = []
+        self.source_rows = {}  # source -> (start, stop)
+        self.source_docs = {}  # source -> ids of the documents sharing its rows, oldest first
+        self.doc_sources = {}  # doc_id -> source
+        self.dead = 0
+        self.compactions = 0
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self.training = False
+
+    def __len__(self):
+        return self.size - self.dead
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_sources
+
+    def add(self, doc_id, passages, embeddings, source=None):
+        """Append a document's passages, replacing any previous version
+
+        A document whose `source` is already indexed only links to its
+        rows; without a source every document is its own.
+        """
+        source = doc_id if source is None else source
+        embeddings = np.asarray(embeddings)
+        with self.lock:
+            self.remove(doc_id)
+            docs = self.source_docs.setdefault(source, [])
+            docs.append(doc_id)
+            self.doc_sources[doc_id] = source
+            count = len(passages)
+            if len(docs) > 1 or count == 0:
+                return
+            self._reserve(self.size + count, embeddings.shape[1])
+            start, stop = self.size, self.size + count
+            self.vectors[start:stop] = embeddings
+            self.alive[start:stop] = True
+            self.row_sources.extend([source] * count)
+            self.row_passages.extend(passages)
+            self.source_rows[source] = (start, stop)
+            self.size = stop
+            if self.centroids is not None:
+                self.assignments[start:stop] = self._assign(self.vectors[start:stop], self.centroids)
+        self._maybe_train()
+
+    def remove(self, doc_id):
+        """Drop a document, e.g. when it is evicted from the store; its rows go with the last document of its source"""
+        with self.lock:
+            source = self.doc_sources.pop(doc_id, None)
+            if source is None:
+                return
+            docs = self.source_docs[source]
+            docs.remove(doc_id)
+            if docs:
+                return
+            del self.source_docs[source]
+            rows = self.source_rows.pop(source, None)
+            if rows is None:
+                return
+            start, stop = rows
+            self.alive[start:stop] = False
+            self.dead += stop - start
+            if self.dead > self.size // 4:
+                self._compact()
+
+    def search(self, query_embedding, top_k=10, doc_ids=None):
+        """Return up to top_k (doc_id, passage, score) tuples, best first
+
+        A passage shared by several documents is reported once, for the
+        most recently added of them (within doc_ids, if given).
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        with self.lock:
+            if len(self) == 0:
+                return []
+            if doc_ids is None and self.centroids is None:
+                # Full scan over the contiguous matrix, no gather copy
+                rows = None
+                scores = self._score(query, self.vectors[:self.size])
+                scores[~self.alive[:self.size]] = -np.inf
+                k = min(top_k, len(self))
+            else:
+                rows = self._candidate_rows(query, doc_ids)
+                if len(rows) == 0:
+                    return []
+                scores = self._score(query, self.vectors[rows])
+                k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_rows = top if rows is None else rows[top]
+            wanted = None if doc_ids is None else set(doc_ids)
+            return [
+                (self._document(self.row_sources[row], wanted), self.row_passages[row], float(score))
+                for row, score in zip(top_rows, scores[top])
+            ]
+
+    def _document(self, source, wanted):
+        docs = self.source_docs[source]
+        if wanted is not None:
+            docs = [doc_id for doc_id in docs if doc_id in wanted]
+        return docs[-1]
+
+    def _candidate_rows(self, query, doc_ids):
+        if doc_ids is not None:
+            sources = {self.doc_sources[d] for d in doc_ids if d in self.doc_sources}
+            ranges = [self.source_rows[s] for s in sources if s in self.source_rows]
+            return np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+        probe = np.argsort(-self.centroids.dot(query))[:self.nprobe]
+        return np.flatnonzero(self.alive[:self.size] & np.isin(self.assignments[:self.size], probe))
+
+    @staticmethod
+    def _score(query, vectors):
+        if vectors.dtype == np.float32:
+            return vectors.dot(query)
+        # numpy has no fast float16 matmul, so upcast block by block
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            scores[start:start + SCAN_BLOCK_ROWS] = vectors[start:start + SCAN_BLOCK_ROWS].astype(np.float32).dot(query)
+        return scores
+
+    def _reserve(self, rows, dim):
+        if self.vectors is None:
+            capacity = max(1024, rows)
+            self.vectors = np.zeros((capacity, dim), dtype=self.dtype)
+            self.alive = np.zeros(capacity, dtype=bool)
+            self.assignments = np.zeros(capacity, dtype=np.int32)
+        elif rows > len(self.vectors):
+            capacity = max(rows, len(self.vectors) * 2)
+            self.vectors = self._grow(self.vectors, capacity)
+            self.alive = self._grow(self.alive, capacity)
+            self.assignments = self._grow(self.assignments, capacity)
+
+    @staticmethod
+    def _grow(array, capacity):
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:self.size])
+        self.vectors[:len(keep)] = self.vectors[keep]
+        self.assignments[:len(keep)] = self.assignments[keep]
+        self.alive[:] = False
+        self.alive[:len(keep)] = True
+        self.row_sources = [self.row_sources[i] for i in keep]
+        self.row_passages = [self.row_passages[i] for i in keep]
+        self.source_rows = {}
+        for row, source in enumerate(self.row_sources):
+            start, _ = self.source_rows.get(source, (row, row))
+            self.source_rows[source] = (start, row + 1)
+        self.size = len(keep)
+        self.dead = 0
+        self.compactions += 1
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            assignments[start:start + len(block)] = np.argmax(block.dot(centroids.T), axis=1)
+        return assignments
+
+    def _maybe_train(self):
+        with self.lock:
+            live = len(self)
+            if self.training or live < self.ivf_min_rows:
+                return
+            # Retrain as the corpus doubles so clusters stay balanced
+            if self.centroids is not None and live < 2 * self.trained_size:
+                return
+            self.training = True
+            lists = self.ivf_lists or int(np.sqrt(live))
+            rows = np.flatnonzero(self.alive[:self.size])
+            sample = self.vectors[rows[np.random.default_rng(0).permutation(len(rows))[:lists * 32]]].astype(np.float32)
+            # Rows below size keep their place until the next compaction
+            vectors, size, compactions = self.vectors, self.size, self.compactions
+
+        try:
+            centroids = kmeans(sample, lists)
+            assignments = self._assign(vectors[:size], centroids)
+            with self.lock:
+                if self.compactions != compactions:
+                    return  # Rows moved meanwhile, the next add trains again
+                self.centroids = centroids
+                self.assignments[:size] = assignments
+                self.assignments[size:self.size] = self._assign(self.vectors[size:self.size], centroids)
+                self.trained_size = live
+        finally:
+            with self.lock:
+                self.training = False